@@ -21,6 +21,16 @@ internal object Config {
             .comment("The maximum amount of time (ms) to wait until a server stops gracefully")
             .worldRestart()
             .defineInRange("shutdownGracePeriod", 1000, 0, Int.MAX_VALUE, Int::class.java)
+
+        val compressionLevel by BUILDER
+            .comment("The deflate level of websocket frames (permessage-deflate, if the client offers it), 0 to disable compression")
+            .worldRestart()
+            .defineInRange("compressionLevel", 6, 0, 9, Int::class.java)
+
+        val compressionThreshold by BUILDER
+            .comment("Websocket frames smaller than this (bytes) are sent without compression")
+            .worldRestart()
+            .defineInRange("compressionThreshold", 4096, 0, Int.MAX_VALUE, Int::class.java)
     }
 
     init {
@@ -1,5 +1,6 @@
 package dev.shblock.codecraft.core.connect
 
+import dev.shblock.codecraft.CodeCraft
 import dev.shblock.codecraft.core.msg.Msg
 import dev.shblock.codecraft.core.registry.CCRegistries
 import dev.shblock.codecraft.utils.CompletedJob
@@ -9,16 +10,19 @@ import dev.shblock.codecraft.utils.buf.BufWriter
 import dev.shblock.codecraft.utils.buf.ByteBuf
 import dev.shblock.codecraft.utils.buf.writeByRegistry
 import dev.shblock.codecraft.utils.dimensions
-import dev.shblock.codecraft.utils.self
 import io.ktor.server.websocket.*
 import io.ktor.websocket.*
 import kotlinx.coroutines.*
+import kotlinx.coroutines.channels.Channel
 import kotlinx.coroutines.channels.ClosedReceiveChannelException
 import kotlinx.coroutines.sync.Mutex
 import kotlinx.coroutines.sync.withLock
 import net.minecraft.core.Registry
 import net.minecraft.core.registries.BuiltInRegistries
+import net.minecraft.resources.ResourceLocation
 import net.minecraft.server.MinecraftServer
+import net.minecraft.world.level.block.Block
+import net.minecraft.world.level.block.state.properties.Property
 import org.slf4j.Logger
 import org.slf4j.LoggerFactory
 
@@ -53,16 +57,55 @@ class CCClient(
         private set
 
     companion object {
-        private fun <SELF : BufWriter<SELF>> BufWriter<SELF>.writeRegistryIdMapSyncPacket(registry: Registry<*>): SELF {
-            writeResLoc(registry.key().location())
-            writeUVarInt(registry.size().toUInt())
-            for (name in registry.keySet()) {
-                writeVarInt(registry.getId(name))
-                writeResLoc(name)
-            }
-            return self
+        /**
+         * Write a section of the registry sync packet: its name, followed by its content as a blob,
+         * so that the client can index the sections without decoding them.
+         */
+        private inline fun ByteBuf<*>.writeSyncPacketSection(name: ResourceLocation, content: ByteBuf<*>.() -> Unit) {
+            val section = ByteBuf()
+            section.content()
+            writeResLoc(name)
+            writeUVarInt(section.size.toUInt())
+            buffer.write(section.buffer, section.size)
         }
 
+        private fun ByteBuf<*>.writeRegistryIdMapSyncPacket(registry: Registry<*>) =
+            writeSyncPacketSection(registry.key().location()) {
+                writeUVarInt(registry.size().toUInt())
+                for (name in registry.keySet()) {
+                    writeVarInt(registry.getId(name))
+                    writeResLoc(name)
+                }
+            }
+
+        /**
+         * Global block state ids, laid out per block in mixed radix order of the property value indices
+         * (see [net.minecraft.world.level.block.state.StateDefinition]).
+         * For each block: the first and default state ids, and the stride and possible values of each property.
+         */
+        private fun ByteBuf<*>.writeBlockStateIdMapSyncPacket() =
+            writeSyncPacketSection(CodeCraft.path("block_state")) {
+                writeUVarInt(BuiltInRegistries.BLOCK.size().toUInt())
+                for (block in BuiltInRegistries.BLOCK) {
+                    val first = block.stateDefinition.possibleStates.first()
+                    val base = Block.getId(first)
+                    writeVarInt(BuiltInRegistries.BLOCK.getId(block))
+                    writeVarInt(base)
+                    writeUVarInt((Block.getId(block.defaultBlockState()) - base).toUInt())
+                    writeUVarInt(block.stateDefinition.properties.size.toUInt())
+                    for (prop in block.stateDefinition.properties) {
+                        @Suppress("UNCHECKED_CAST")
+                        prop as Property<Comparable<Any>>
+                        val values = prop.possibleValues.toList()
+                        val stride = if (values.size > 1) Block.getId(first.setValue(prop, values[1])) - base else 0
+                        writeStr(prop.name)
+                        writeUVarInt(stride.toUInt())
+                        writeUVarInt(values.size.toUInt())
+                        for (value in values) writeStr(prop.getName(value))
+                    }
+                }
+            }
+
         private val registrySyncPacket by lazy {
             ByteBuf().also { buf ->
                 arrayOf(
@@ -73,10 +116,17 @@ class CCClient(
                     BuiltInRegistries.ENTITY_TYPE,
                     CCServer.mc.dimensions() //TODO: handle dynamic dimensions?
                 ).forEach { buf.writeRegistryIdMapSyncPacket(it) }
+                buf.writeBlockStateIdMapSyncPacket()
             }
         }
 
         private val registrySyncPacketChecksum by lazy(registrySyncPacket::checksum)
+
+        /**
+         * Messages are batched into frames up to this size (a single larger message is still sent alone),
+         * well below the default max frame size of the Python client.
+         */
+        private const val MAX_BATCHED_FRAME_SIZE = 1L shl 18
     }
 
     private suspend fun establishSyncRegistryIdMap() {
@@ -100,6 +150,7 @@ class CCClient(
 
         _cmdContext = CCClientCmdContext(this)
         lifecycle = Lifecycle.ACTIVE
+        scope.launch { msgSenderLoop() }
         logger.info("Established")
     }
 
@@ -137,6 +188,7 @@ class CCClient(
 
                     if (lifecycle == Lifecycle.ACTIVE) cmdContext.close()
                     lifecycle = Lifecycle.CLOSED
+                    outgoingMsgs.close()
                     logger.info("Closing connection: ${reason.knownReason?.name}, \"${reason.message}\"")
                     @OptIn(DelicateCoroutinesApi::class)
                     if (!session.incoming.isClosedForReceive) runCatching { session.close(reason) }
@@ -188,11 +240,40 @@ class CCClient(
         return ByteBuf(frame.data)
     }
 
-    suspend fun sendMsg(msg: Msg) { // TODO batching
+    /** Encoded messages waiting for [msgSenderLoop], which may be queued from any thread. */
+    private val outgoingMsgs = Channel<ByteBuf<*>>(Channel.UNLIMITED)
+
+    fun sendMsg(msg: Msg) {
         ensureActive()
-        sendRaw {
-            writeByRegistry(msg::class, CCRegistries.MSG)
-            msg.write(cmdContext, this@sendRaw)
+        val buf = ByteBuf()
+        buf.encodeMsg(msg)
+        // only fails if the client has been closed in the meantime, the message is dropped then
+        outgoingMsgs.trySend(buf)
+    }
+
+    private fun BufWriter<*>.encodeMsg(msg: Msg) {
+        writeByRegistry(msg::class, CCRegistries.MSG)
+        msg.write(cmdContext, this)
+    }
+
+    /**
+     * Send the queued messages, the ones queued while a frame is being sent are batched into the next frame,
+     * so that a burst of command results doesn't cost a frame each (the client reads messages until a frame is exhausted).
+     */
+    private suspend fun msgSenderLoop() {
+        try {
+            for (frame in outgoingMsgs) {
+                while (frame.size < MAX_BATCHED_FRAME_SIZE) {
+                    val next = outgoingMsgs.tryReceive().getOrNull() ?: break
+                    frame.buffer.write(next.buffer, next.size)
+                }
+                sendRaw(frame)
+            }
+        } catch (e: CancellationException) {
+            throw e
+        } catch (e: Exception) {
+            // the client has been closed by sendRaw()
+            logger.debug("Message sender stopped: $e")
         }
     }
 
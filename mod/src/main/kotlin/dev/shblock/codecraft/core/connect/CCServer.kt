@@ -45,6 +45,14 @@ object CCServer {
             install(WebSockets) {
 //                pingPeriod = Duration.ofSeconds(5)
 //                timeout = Duration.ofSeconds(0)
+                if (Config.Server.compressionLevel > 0) {
+                    extensions {
+                        install(WebSocketDeflateExtension) {
+                            compressionLevel = Config.Server.compressionLevel
+                            compressIfBiggerThan(Config.Server.compressionThreshold)
+                        }
+                    }
+                }
             }
             routing {
                 webSocket {
@@ -4,7 +4,9 @@ import dev.shblock.codecraft.core.cmd.CmdContext
 import dev.shblock.codecraft.core.cmd.CmdResult
 import dev.shblock.codecraft.core.registry.CCAutoReg
 import dev.shblock.codecraft.utils.buf.BufWriter
+import dev.shblock.codecraft.utils.buf.ByteBuf
 import dev.shblock.codecraft.utils.buf.writeEnum
+import kotlinx.io.readByteString
 
 @CCAutoReg("cmd_result")
 internal class CmdResultMsg internal constructor(
@@ -16,6 +18,9 @@ internal class CmdResultMsg internal constructor(
         super.write(context, buf)
         buf.writeUVarInt(result.uid)
         buf.writeEnum(result.type)
-        buf.(result.resultWriter)()
+        // length-prefixed, so that the client can defer parsing it
+        val payload = ByteBuf()
+        payload.(result.resultWriter)()
+        buf.writeBlob(payload.buffer.readByteString())
     }
 }
\ No newline at end of file
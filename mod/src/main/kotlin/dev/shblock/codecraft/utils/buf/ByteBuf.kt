@@ -16,6 +16,7 @@ import net.minecraft.nbt.NbtAccounter
 import net.minecraft.nbt.NbtIo
 import net.minecraft.nbt.Tag
 import net.minecraft.resources.ResourceLocation
+import net.minecraft.world.level.block.Block
 import net.minecraft.world.level.block.state.BlockState
 import net.minecraft.world.level.block.state.StateDefinition
 import net.minecraft.world.level.block.state.StateHolder
@@ -210,15 +211,13 @@ class ByteBuf<SELF : ByteBuf<SELF>>(@PublishedApi internal val buffer: Buffer) :
         }
     }
 
+    // global state ids, synced to the client along with the registry id maps
     override fun readBlockState(): BlockState {
-        val block = readByRegistryOrThrow(BuiltInRegistries.BLOCK).value()
-        return readStateHolderValues(block.defaultBlockState(), block.stateDefinition)
+        val id = readVarInt()
+        return Block.BLOCK_STATE_REGISTRY.byId(id) ?: throw BufException("Invalid block state id $id")
     }
 
-    override fun writeBlockState(value: BlockState) = self.also {
-        writeByRegistry(value.block, BuiltInRegistries.BLOCK)
-        writeStateHolderValues(value)
-    }
+    override fun writeBlockState(value: BlockState) = self.also { writeVarInt(Block.getId(value)) }
 
     override fun readFluidState(): FluidState {
         val fluid = readByRegistryOrThrow(BuiltInRegistries.FLUID).value()
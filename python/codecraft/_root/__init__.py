@@ -3,8 +3,8 @@
 
 from codecraft.internal.constants import *
 
-from codecraft.internal import ResLoc, CmdError
-from codecraft.client import CCClient
+from codecraft.internal import ResLoc, CmdError, BroadcastError
+from codecraft.client import CCClient, BroadcastClient
 from codecraft.block import Block
 from codecraft.enums import Direction
 from codecraft.entity import Entity
@@ -9,10 +9,12 @@ from codecraft.internal.resource import ResLoc
 from codecraft.internal.registry import Registered, DefaultedInstantiatingRegistry
 
 if TYPE_CHECKING:
-    from typing import Any, Iterable, Optional
+    from typing import Any, Iterable, Optional, Self
     from collections.abc import Collection
 
-    from codecraft.internal import ResLocLike
+    from amulet_nbt import CompoundTag
+
+    from codecraft.internal import ResLocLike, FrozenNBT
 
 
 # noinspection PyProtectedMember
@@ -32,13 +34,12 @@ class BlockMeta(type):
         return type.__new__(cls, name, bases, dic, **kwargs)
 
 
-# TODO: block entity NBT
 class Block(Registered["Block", DefaultedInstantiatingRegistry["Block"]],
             LazyDefaultInstance,
             metaclass=BlockMeta,
             registry_name="block",
             registry_type=DefaultedInstantiatingRegistry):
-    __slots__ = "reg_name", "_states", "_extra_properties"
+    __slots__ = "reg_name", "_nbt", "_states", "_extra_properties", "_frozen"
 
     _properties: dict[str, BlockStateProperty[Any]]
 
@@ -49,7 +50,43 @@ class Block(Registered["Block", DefaultedInstantiatingRegistry["Block"]],
             self.reg_name = ResLoc.from_like(reg_name)
 
         self._states: dict[str, Any] = {}
+        self._nbt: Optional[CompoundTag | FrozenNBT] = None
         self._extra_properties: Optional[dict[str, BlockStateProperty[Any]]] = extra_properties
+        self._frozen = False
+
+    @property
+    def nbt(self) -> Optional[CompoundTag | FrozenNBT]:
+        """The block entity data, use a `FrozenNBT` if the same data is placed many times."""
+        return self._nbt
+
+    @nbt.setter
+    def nbt(self, value: Optional[CompoundTag | FrozenNBT]):
+        self._check_mutable()
+        self._nbt = value
+
+    @property
+    def frozen(self) -> bool:
+        """Whether this is a shared instance (see `Registry.get_shared()`), which can't be modified."""
+        return self._frozen
+
+    def _freeze(self):
+        self._frozen = True
+
+    def _check_mutable(self):
+        if self._frozen:
+            raise AttributeError(f"{self} is a shared instance and can't be modified, modify a copy() instead")
+
+    def copy(self) -> Self:
+        """A mutable copy of this block (the NBT isn't copied)."""
+        block = object.__new__(type(self))
+        # the register name is a class attribute for registered subclasses
+        reg_name = None if isinstance(getattr(type(self), "reg_name", None), ResLoc) else self.reg_name
+        Block.__init__(block, reg_name, **self._extra_properties)
+        block._states.update(self._states)
+        block._nbt = self._nbt
+        if hasattr(self, "__dict__"):
+            block.__dict__.update(self.__dict__)
+        return block
 
     def _get_property(self, name: str) -> BlockStateProperty[Any]:
         prop = self._properties.get(name)
@@ -75,6 +112,7 @@ class Block(Registered["Block", DefaultedInstantiatingRegistry["Block"]],
     @final
     def __setitem__[T](self, name: str, value: T | BlockStateProperty[T]):
         if isinstance(value, BlockStateProperty):
+            self._check_mutable()
             self._extra_properties[name] = value
         else:
             self._get_property(name).set(self, value)
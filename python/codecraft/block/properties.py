@@ -38,6 +38,7 @@ class BlockStateProperty[T](ABC):
         return self.get(instance)
 
     def set(self, instance: Block, value: T):
+        instance._check_mutable()
         instance._states[self._name] = value
 
     def __set__(self, instance: Block, value: T):
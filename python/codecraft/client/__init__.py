@@ -1 +1,4 @@
 from .client import CCClient
+from .broadcast import BroadcastClient
+from .cmd_runner import CmdHandle
+from .subscription import OverflowPolicy, Subscription, SubscriptionOverflowError
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import copy
+import itertools
+from typing import final, TYPE_CHECKING
+
+from websockets.frames import CloseCode
+
+from .client import CCClient
+from codecraft.coro import auto_async
+from codecraft.internal.error import NetworkError, BroadcastError
+from codecraft.log.log import LOGGER
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Iterable
+    from typing import Any, Optional
+    from logging import Logger
+
+    from codecraft.internal.byte_buf.byte_buf import ByteBuf
+    from codecraft.internal.cmd import Cmd
+    from codecraft.internal.msg import CmdResultMsg
+
+
+# noinspection PyProtectedMember
+@final
+class BroadcastClient:
+    """Runs every command on multiple servers at once, e.g. the same build script for a whole classroom.
+
+    The clients of all the servers share one networking thread and one sequence of command uids,
+    so a command is encoded only once for all the servers with the same registries
+    and the same bytes are sent to each of them.
+
+    The result of a command is a list of the results of every server (in the order of `clients`).
+    If it fails on any server, a `BroadcastError` with the errors of the failed servers is raised.
+    Entering it with a `with` statement makes it the current client, so that the regular API broadcasts.
+    Batching, pipelining and subscribing aren't supported, use the `clients` for those.
+    """
+
+    def __init__(self, uris: Iterable[str], name: str = None, *, establish: bool = True):
+        uris = list(uris)
+        if not uris:
+            raise ValueError("No servers to broadcast to")
+
+        self._name = name if name is not None else f"{len(uris)} servers"
+        self._logger = LOGGER.getChild(f"Broadcast({self._name})")
+
+        # the members mustn't become the default current client
+        last_current = CCClient._set_current(None)
+        first = CCClient(uris[0], establish=False)
+        self._clients: tuple[CCClient, ...] = (
+            first,
+            *(CCClient(uri, establish=False, share_thread_with=first) for uri in uris[1:])
+        )
+        CCClient._set_current(last_current if last_current is not None else self)
+
+        cmd_uids = itertools.count()
+        for client in self._clients:
+            client._cmd_uids = cmd_uids
+
+        # indices of the clients with the same registry checksum, set once established
+        self._groups: list[list[int]] = []
+
+        if establish:
+            self.establish()
+
+    @auto_async
+    async def establish(self):
+        if self.established:
+            raise ValueError("Already established")
+
+        await asyncio.gather(*(client.establish() for client in self._clients))
+
+        groups: dict[int, list[int]] = {}
+        for i, client in enumerate(self._clients):
+            groups.setdefault(client._reg_checksum, []).append(i)
+        self._groups = list(groups.values())
+        if len(self._groups) > 1:
+            self._logger.warning(f"Servers have {len(self._groups)} different registries, commands are encoded for each")
+
+    @property
+    def established(self) -> bool:
+        return bool(self._groups) and all(client.established for client in self._clients)
+
+    def ensure_established(self):
+        if not self.established:
+            raise NetworkError("Not established")
+
+    @auto_async
+    async def close(self, reason: str = "", code: int = CloseCode.NORMAL_CLOSURE):
+        """Close all the clients, thread safe."""
+        await asyncio.gather(*(client.close(reason, code) for client in self._clients))
+
+    def run_cmd(self, cmd: Cmd) -> Awaitable[list[Any]]:
+        self.ensure_established()
+        return self._broadcast(cmd)
+
+    async def _broadcast(self, cmd: Cmd) -> list[Any]:
+        runs: list[Optional[Awaitable[Any]]] = [None] * len(self._clients)
+        bufs: list[ByteBuf] = []
+        for group_index, group in enumerate(self._groups):
+            # the command is written once for every group, the uid it takes is shared by the group
+            group_cmd = cmd if group_index == 0 else copy.copy(cmd)
+            group_cmd._uid = None
+            encoder = self._clients[group[0]]
+            buf = encoder._buf_pool.acquire()
+            bufs.append(buf)
+            buf.write_using_id_map(encoder.reg_id_maps.cmd, type(group_cmd))
+            group_cmd._write(buf, encoder)
+
+            for i in group:
+                client = self._clients[i]
+                # registered before sending anything, like SimpleCmdRunner
+                waiter = client._msg_queue._wait_for_result(group_cmd)
+                runs[i] = self._run_on(client, group_cmd, buf, waiter)
+
+        try:
+            results = await asyncio.gather(*runs, return_exceptions=True)
+        finally:
+            for buf, group in zip(bufs, self._groups):
+                self._clients[group[0]]._buf_pool.release(buf)
+
+        failed = [i for i, result in enumerate(results) if isinstance(result, BaseException)]
+        if not failed:
+            return results
+        for i in failed:
+            if not isinstance(results[i], Exception):  # e.g. cancelled
+                raise results[i]
+        for i in failed:
+            results[i].add_note(f"On server {i} ({self._clients[i].name})")
+        raise BroadcastError(
+            f"Command failed on {len(failed)} of {len(results)} servers",
+            [results[i] for i in failed],
+            failed,
+            results
+        )
+
+    @staticmethod
+    async def _run_on(client: CCClient, cmd: Cmd, buf: ByteBuf, waiter: Awaitable[CmdResultMsg]) -> Any:
+        await client.send_raw(buf, client._conn_for(cmd))
+        return await client._run_cmd_coro(waiter)
+
+    @property
+    def clients(self) -> tuple[CCClient, ...]:
+        return self._clients
+
+    def __enter__(self):
+        self._last_current = CCClient._set_current(self)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        CCClient._set_current(self._last_current)
+
+    def __repr__(self):
+        return f"BroadcastClient(\"{self.name}\")"
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def logger(self) -> Logger:
+        return self._logger
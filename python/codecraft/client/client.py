@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
 from collections.abc import Awaitable
 
 import time
@@ -11,20 +12,27 @@ from websockets.frames import CloseCode, CLOSE_CODE_EXPLANATIONS
 
 from .id_maps import RegistryIdMaps
 from .msg_queue import MsgQueue
-from .connection import Connection
-from .cmd_runner import SimpleCmdRunner, CmdRunner, BatchingCmdRunner
+from .connection import Connection, LoopBoundConnection
+from .compression import compression_extensions
+from .flow_control import FlowControl
+from .cmd_runner import SimpleCmdRunner, CmdRunner, BatchingCmdRunner, PipeliningCmdRunner
+from .subscription import OverflowPolicy, Subscription
 from codecraft.log.log import LOGGER
 from codecraft.coro import auto_async
 from codecraft.coro import set_task_name
 from codecraft.internal.error import NetworkError, CmdError
+from codecraft.internal.msg import CmdResultMsg, Msg
 from ..internal.byte_buf.byte_buf import ByteBuf
+from ..internal.byte_buf.byte_buf_pool import ByteBufPool
+from ..internal.byte_buf.tagged import TaggedByteBuf
+from ..config import CCConfig
 
 if TYPE_CHECKING:
     from typing import Optional, Self, Any
     from logging import Logger
 
     from codecraft.internal.cmd import Cmd
-    from codecraft.internal.msg import CmdResultMsg
+    from .broadcast import BroadcastClient
 
 import threading
 
@@ -32,29 +40,78 @@ import threading
 # noinspection PyProtectedMember
 @final
 class CCClient:
-    def __init__(self, uri: str, name: str = None, *, establish: bool = True):
+    def __init__(
+        self,
+        uri: str,
+        name: str = None,
+        *,
+        establish: bool = True,
+        same_loop: bool = False,
+        connections: int = 1,
+        share_thread_with: Optional[CCClient] = None
+    ):
+        """
+        :param same_loop: bind the connection to the event loop that establishes the client instead of
+            running it on a networking thread, which is faster for async applications,
+            but the client can only be used from that loop afterward
+            (for synchronous use, that's the loop of `codecraft.coro`'s runner).
+            Async applications should pass `establish=False` and await `establish()`.
+        :param connections: the number of connections to open to the server,
+            commands are spread across them by their shard key (e.g. the chunk of a block),
+            only commands of the same key are guaranteed to be executed in order.
+        :param share_thread_with: run on the networking thread of another client instead of starting one
+        """
+        if connections < 1:
+            raise ValueError(f"Invalid connection count: {connections}")
+
         if CCClient.__current is None:  # first instance becomes the default current client
             CCClient.__current = self
 
         self._uri = uri
         self._name = name if name is not None else uri
         self._logger = LOGGER.getChild(f"Client({self._name})")
-        self._conn: Connection = Connection(
-            self,
+        conn_type = LoopBoundConnection if same_loop else Connection
+        conn_kwargs = dict(
             uri=uri,
             open_timeout=10,
             ping_interval=5,
             close_timeout=5,
-            ping_timeout=None
+            ping_timeout=None,
+            compression=None,  # offered by the extensions instead
+            extensions=compression_extensions()
+        )
+        # the primary connection, which also syncs the registry id maps and runs the commands without a shard key
+        self._conn: Connection = conn_type(
+            self,
+            share_thread_with=share_thread_with._conn if share_thread_with is not None else None,
+            **conn_kwargs
+        )
+        self._conns: tuple[Connection, ...] = (
+            self._conn,
+            *(conn_type(self, share_thread_with=self._conn, **conn_kwargs) for _ in range(connections - 1))
         )
 
         self._connected = False
         self._established = False
 
         self._id_maps: RegistryIdMaps
-        self._msg_queue = MsgQueue(self)
+        # checksum of the server's registry id maps, clients with the same one encode commands identically
+        self._reg_checksum: Optional[int] = None
+        self._msg_queue = MsgQueue(self, threaded=not same_loop)
+        self._buf_pool = ByteBufPool(self, buf_type=TaggedByteBuf if CCConfig.debug_tagged_buffers else ByteBuf)
 
-        self.__cmd_uid = -1
+        # replaced with a shared one by BroadcastClient
+        self._cmd_uids = itertools.count()
+
+        self._flow_control: Optional[FlowControl] = (
+            FlowControl(CCConfig.max_in_flight_cmds) if CCConfig.flow_control else None
+        )
+
+        # run commands called from synchronous code without an event loop, see `SimpleCmdRunner._run_cmd_blocking()`
+        self._loop_free_sync = CCConfig.loop_free_sync and not same_loop
+
+        # parse command results when they are read instead of in the receiver, see `CmdResultMsg`
+        self._defer_result_parsing = CCConfig.defer_result_parsing
 
         # also set by BatchingCmdRunner
         self._cmd_runner: CmdRunner = SimpleCmdRunner(self)
@@ -65,30 +122,46 @@ class CCClient:
             self.establish()
 
     def _next_cmd_uid(self) -> int:
-        self.__cmd_uid += 1
-        return self.__cmd_uid
+        return next(self._cmd_uids)
 
     @property
     def msg_queue(self) -> MsgQueue:
         return self._msg_queue
 
-    async def _establish_sync_registry_id_map(self):
-        checksum = (await self.recv_raw()).read_ulong()
-        checksum = f"{checksum:016X}"
-        self._logger.debug(f"Server registry id maps checksum: {checksum}")
-        # self._id_maps = RegistryIdMaps.load_cache(hash, self) # TODO: configurable
-        self._id_maps = None
+    @property
+    def flow_control(self) -> Optional[FlowControl]:
+        return self._flow_control
+
+    def _conn_for(self, cmd: Cmd) -> Connection:
+        if len(self._conns) == 1 or (key := cmd._shard_key()) is None:
+            return self._conn
+        return self._conns[hash(key) % len(self._conns)]
+
+    async def _establish_sync_registry_id_map(self) -> int:
+        checksum = self._reg_checksum = (await self.recv_raw()).read_ulong()
+        self._logger.debug(f"Server registry id maps checksum: {checksum:016X}")
+        if CCConfig.cache_registry_id_maps:
+            self._id_maps = RegistryIdMaps.load_cache(checksum, self)
+        else:
+            self._id_maps = None
         if self._id_maps is not None:  # cached
             self._logger.debug("Loaded registry id map from cache")
             await self.send_raw(ByteBuf().write_bool(True))
         else:  # not cached
             await self.send_raw(ByteBuf().write_bool(False))
             sync_packets = await self.recv_raw()
-            self._id_maps = RegistryIdMaps(self)
-            while sync_packets.remaining:
-                self._id_maps.read_sync_packet(sync_packets)
+            self._id_maps = RegistryIdMaps(self, sync_packets)
             self._logger.debug("Received registry id maps")
-            self._id_maps.save_cache(checksum)
+            if CCConfig.cache_registry_id_maps:
+                RegistryIdMaps.save_cache(checksum, sync_packets)
+        return checksum
+
+    async def _establish_secondary(self, conn: Connection, checksum: int):
+        """Establish an additional connection, skipping the registry transfer since the id maps are synced already."""
+        if (await self.recv_raw(conn)).read_ulong() != checksum:
+            raise NetworkError("Server registry id maps changed while establishing")
+        await self.send_raw(ByteBuf().write_bool(True), conn)
+        await self.send_raw(ByteBuf().write_bool(True), conn)
 
     @property
     def reg_id_maps(self) -> RegistryIdMaps:
@@ -106,7 +179,7 @@ class CCClient:
         self._logger.info("Establishing...")
         t = time.perf_counter()
         try:
-            await self._conn.connect()
+            await asyncio.gather(*(conn.connect() for conn in self._conns))
         except Exception as e:
             self._logger.info(f"Failed to connect to CodeCraft server at <{self._uri}>: %s", e)
             raise NetworkError(f"Failed to connect to CodeCraft server at <{self._uri}>: {e}") from e
@@ -116,12 +189,13 @@ class CCClient:
 
         atexit.register(self.close, "Script exited", CloseCode.GOING_AWAY)
 
-        await self._establish_sync_registry_id_map()
+        checksum = await self._establish_sync_registry_id_map()
 
         await self.send_raw(ByteBuf().write_bool(True))
+        await asyncio.gather(*(self._establish_secondary(conn, checksum) for conn in self._conns[1:]))
         self._established = True
 
-        asyncio.run_coroutine_threadsafe(self._msg_queue._start(), self._conn.loop).result()
+        await self._conn._run(self._msg_queue._start())
 
         self._logger.info(f"Established in {(time.perf_counter() - t) * 1e3:.0f}ms")
 
@@ -150,7 +224,8 @@ class CCClient:
             else:
                 self._logger.info("Client closing")
             # we run this even if the network connection has already been closed to terminate the networking thread, etc.
-            await self._conn.close(reason=reason, code=code)
+            for conn in self._conns:
+                await conn.close(reason=reason, code=code)
             self._logger.info("Client closed")
 
     def __del__(self):
@@ -159,17 +234,19 @@ class CCClient:
         if threading.current_thread().is_alive():
             self.close("CCClient object destructing", CloseCode.GOING_AWAY)
 
-    async def send_raw(self, buf: ByteBuf) -> Self:
+    async def send_raw(self, buf: ByteBuf, conn: Optional[Connection] = None) -> Self:
+        """Send the written content of `buf`, through the primary connection unless `conn` is specified."""
         try:
-            await self._conn.send(buf.written_view)
+            await (conn or self._conn).send(buf.written_view)
         except ConnectionClosed as e:
             self.close(code=CloseCode.ABNORMAL_CLOSURE)
             raise NetworkError(f"Connection closed: {str(e)}") from e
         return self
 
-    async def recv_raw(self) -> ByteBuf:
+    async def recv_raw(self, conn: Optional[Connection] = None) -> ByteBuf:
+        """Receive a frame, from the primary connection unless `conn` is specified."""
         try:
-            frame = await self._conn.recv()
+            frame = await (conn or self._conn).recv()
         except ConnectionClosed as e:
             _ = asyncio.create_task(self.close(code=CloseCode.ABNORMAL_CLOSURE))
             raise NetworkError(f"Connection closed: {str(e)}") from e
@@ -178,16 +255,29 @@ class CCClient:
             _ = asyncio.create_task(self.close("Received invalid string frame", CloseCode.POLICY_VIOLATION))
             raise NetworkError(f"Invalid frame format: string")
 
-        return ByteBuf(frame, client=self)
+        # a read-only view of the frame, avoids copying potentially large frames
+        return ByteBuf(memoryview(frame), client=self)
 
     def run_cmd(self, cmd: Cmd):
+        """Run a command, return an awaitable of its result.
+
+        From synchronous code, the result is returned directly if `CCConfig.loop_free_sync` applies,
+        and a `CmdHandle` is returned while pipelining.
+        """
         self.ensure_established()
-        return self._run_cmd_coro(self._cmd_runner._run_cmd(cmd))
+        runner = self._cmd_runner
+        if isinstance(runner, PipeliningCmdRunner):
+            return runner._run_cmd(cmd)
+        # noinspection PyUnresolvedReferences
+        if self._loop_free_sync and type(runner) is SimpleCmdRunner and asyncio._get_running_loop() is None:
+            return self._cmd_result(runner._run_cmd_blocking(cmd))
+        return self._run_cmd_coro(runner._run_cmd(cmd))
 
-    # noinspection PyMethodMayBeStatic
     async def _run_cmd_coro(self, waiter: Awaitable[CmdResultMsg]) -> Optional[Any]:
-        msg = await waiter
+        return self._cmd_result(await waiter)
 
+    # noinspection PyMethodMayBeStatic
+    def _cmd_result(self, msg: CmdResultMsg) -> Optional[Any]:
         if msg.successful:
             return msg.result
         else:
@@ -197,7 +287,47 @@ class CCClient:
         self.ensure_established()
         return BatchingCmdRunner(self)
 
-    __current: Optional[CCClient] = None
+    def pipeline(self):
+        """Pipeline the commands run in a (synchronous) `with` block.
+
+        The commands return a `CmdHandle` immediately instead of waiting for their result,
+        the result is only waited for when it's read with `CmdHandle.result()`.
+        Exiting the block waits for all the results, and raises the first error that hasn't been read.
+        """
+        self.ensure_established()
+        return PipeliningCmdRunner(self)
+
+    def subscribe[T: Msg](
+        self,
+        msg_type: type[T],
+        *,
+        maxsize: Optional[int] = None,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST
+    ) -> Subscription[T]:
+        """Receive the messages of a type (including subclasses) pushed by the server, thread safe.
+
+        e.g. `async for msg in client.subscribe(SomeMsg): ...`, or `with client.subscribe(SomeMsg) as sub: ...`
+        to stop receiving them afterward. Only the messages received after subscribing are delivered.
+
+        :param maxsize: the size of the queue of the subscription, `CCConfig.subscription_queue_size` by default
+        :param overflow: what to do with new messages when the queue is full, receiving never waits for
+            a slow consumer, `OverflowPolicy.FAIL` closes the subscription instead of losing messages
+        """
+        if not (isinstance(msg_type, type) and issubclass(msg_type, Msg)):
+            raise TypeError(f"Not a message type: {msg_type!r}")
+        if issubclass(msg_type, CmdResultMsg):
+            raise ValueError("Command results are only delivered to the commands")
+
+        sub = Subscription(
+            self._msg_queue,
+            msg_type,
+            CCConfig.subscription_queue_size if maxsize is None else maxsize,
+            overflow
+        )
+        self._msg_queue._subscribe(sub)
+        return sub
+
+    __current: Optional[CCClient | BroadcastClient] = None
 
     @classmethod
     def current(cls):
@@ -205,12 +335,17 @@ class CCClient:
             raise ValueError("No active client!")
         return cls.__current
 
+    @classmethod
+    def _set_current(cls, client: Optional[CCClient | BroadcastClient]) -> Optional[CCClient | BroadcastClient]:
+        """Set the current client and return the previous one."""
+        last, cls.__current = cls.__current, client
+        return last
+
     def __enter__(self):
-        self._last_current = CCClient.__current
-        CCClient.__current = self
+        self._last_current = CCClient._set_current(self)
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        CCClient.__current = self._last_current
+        CCClient._set_current(self._last_current)
 
     def __repr__(self):
         return f"CCClient(\"{self.name}\")"
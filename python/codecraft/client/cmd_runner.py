@@ -1,16 +1,26 @@
 from __future__ import annotations
 
 import asyncio
+import concurrent.futures
+import time
 from asyncio import Task
-from typing import TYPE_CHECKING, override
+from typing import TYPE_CHECKING, override, final
 from abc import ABC, abstractmethod
 
+from codecraft.config import CCConfig
+# noinspection PyProtectedMember
+from codecraft.coro.coro import _RUNNER
 from codecraft.internal.byte_buf.byte_buf import ByteBuf
+from codecraft.internal.error import NetworkError
 from codecraft.internal.msg import CmdResultMsg
 
 if TYPE_CHECKING:
+    from collections.abc import Awaitable
+    from typing import Optional, Self, Any
+
     from codecraft.internal.cmd import Cmd
     from codecraft.client import CCClient
+    from codecraft.client.connection import Connection
 
 
 class CmdRunner(ABC):
@@ -26,13 +36,46 @@ class CmdRunner(ABC):
 class SimpleCmdRunner(CmdRunner):
     @override
     async def _run_cmd(self, cmd: Cmd):
-        buf = ByteBuf(client=self._client)
-        buf.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
-        cmd._write(buf, self._client)
+        flow = self._client._flow_control
+        if flow is None:
+            return await self._send_and_wait(cmd)
+
+        await flow.acquire()
+        rtt = None
+        try:
+            t = time.perf_counter()
+            result = await self._send_and_wait(cmd)
+            rtt = time.perf_counter() - t
+            return result
+        finally:
+            flow.release(rtt)
+
+    def _run_cmd_blocking(self, cmd: Cmd) -> CmdResultMsg:
+        """Run a command from synchronous code without an event loop, blocking the calling thread.
+
+        The message is queued on the networking thread directly and the result is waited for with a concurrent future.
+        Not limited by flow control, the calling thread only has this one command in flight anyway.
+        """
+        conn = self._client._conn_for(cmd)
+        # the buffer is only released once the result has arrived, by then the networking thread is done with it
+        # (it's discarded if anything fails, see `ByteBufPool.borrow()`)
+        with self._client._buf_pool.borrow() as buf:
+            buf.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
+            cmd._write(buf, self._client)
+            try:
+                return self._client._msg_queue._wait_for_result_blocking(
+                    cmd, lambda: conn.send_nowait(buf.written_view))
+            except concurrent.futures.CancelledError as e:
+                raise NetworkError("Connection closed") from e
 
-        waiter = self._client._msg_queue._wait_for_result(cmd)
+    async def _send_and_wait(self, cmd: Cmd) -> CmdResultMsg:
+        with self._client._buf_pool.borrow() as buf:
+            buf.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
+            cmd._write(buf, self._client)
 
-        await self._client.send_raw(buf)
+            waiter = self._client._msg_queue._wait_for_result(cmd)
+
+            await self._client.send_raw(buf, self._client._conn_for(cmd))
 
         return await waiter
 
@@ -42,7 +85,8 @@ class BatchingCmdRunner(CmdRunner):
     def __init__(self, client: CCClient):
         super().__init__(client)
         self._old_cmd_runner: CmdRunner
-        self._buffer = ByteBuf(client=self._client)
+        # a buffer for each connection used by the batch
+        self._buffers: dict[Connection, ByteBuf] = {}
         self._waiters: list[Task] = []
 
     async def __aenter__(self):
@@ -55,20 +99,29 @@ class BatchingCmdRunner(CmdRunner):
         if exc_val is not None:
             for waiter in self._waiters:
                 waiter.cancel("Command wasn't sent")
-            self._buffer = ByteBuf(client=self._client)
+            for buffer in self._buffers.values():
+                self._client._buf_pool.release(buffer)
+            self._buffers.clear()
             self._waiters.clear()
             return False
 
-        await self._client.send_raw(self._buffer)
-        self._buffer = ByteBuf(client=self._client)
+        # the buffers are only returned to the pool if they have been sent successfully
+        await asyncio.gather(*(self._client.send_raw(buffer, conn) for conn, buffer in self._buffers.items()))
+        for buffer in self._buffers.values():
+            self._client._buf_pool.release(buffer)
+        self._buffers.clear()
         self._waiters.clear()
 
     @override
     def _run_cmd(self, cmd: Cmd):
         # not async def to make sure the sending logic runs immediately
 
-        self._buffer.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
-        cmd._write(self._buffer, self._client)
+        conn = self._client._conn_for(cmd)
+        buffer = self._buffers.get(conn)
+        if buffer is None:
+            buffer = self._buffers[conn] = self._client._buf_pool.acquire()
+        buffer.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
+        cmd._write(buffer, self._client)
 
         waiter = asyncio.create_task(
             self._client._msg_queue._wait_for_result(cmd))
@@ -78,3 +131,170 @@ class BatchingCmdRunner(CmdRunner):
 
     def __enter__(self):
         raise ValueError("CmdBatch can't be used with regular with statement, use async with instead")
+
+
+# noinspection PyProtectedMember
+class PipeliningCmdRunner(CmdRunner):
+    """Runs commands without waiting for their results, for synchronous code (see `CCClient.pipeline()`).
+
+    Commands are buffered and sent when the buffers get large,
+    when the result of a command is needed, or when the pipeline is exited.
+    """
+
+    def __init__(self, client: CCClient):
+        super().__init__(client)
+        self._old_cmd_runner: CmdRunner
+        # a buffer for each connection with commands that haven't been sent yet
+        self._buffers: dict[Connection, ByteBuf] = {}
+        self._buffered_size = 0
+        self._flush_size = CCConfig.pipeline_flush_size
+        self._pending: list[CmdHandle] = []
+        # the number of handles at the end of `_pending` whose commands are still buffered
+        self._unsent = 0
+
+    def __enter__(self) -> Self:
+        # noinspection PyUnresolvedReferences
+        if asyncio._get_running_loop() is not None:
+            raise ValueError("Pipelining is for synchronous code, use batch_cmd() or asyncio.gather() instead")
+        self._old_cmd_runner = self._client._cmd_runner
+        self._client._cmd_runner = self
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._client._cmd_runner = self._old_cmd_runner
+
+        try:
+            if exc_val is None:
+                self._finish()
+        finally:
+            # exited by an error (or interrupted while finishing)
+            self._drop_pending()
+        return False
+
+    def _finish(self):
+        self.flush()
+        results = _RUNNER.run(self._wait_all(self._pending))
+        pending, self._pending = self._pending, []
+        for handle, result in zip(pending, results):
+            handle._set(result)
+        # failures would go unnoticed otherwise
+        for handle in pending:
+            if not handle._retrieved and handle._exception is not None:
+                raise handle._exception
+
+    def _drop_pending(self):
+        """Cancel the handles that haven't been resolved, the commands that have been sent still run,
+        but nobody is going to wait for their results.
+        """
+        for buffer in self._buffers.values():
+            self._client._buf_pool.release(buffer)
+        self._buffers.clear()
+        pending, self._pending = self._pending, []
+        first_unsent = len(pending) - self._unsent
+        self._unsent = 0
+        for i, handle in enumerate(pending):
+            self._client._msg_queue._discard_waiter(handle._cmd, handle._waiter, sent=i < first_unsent)
+            handle._set(concurrent.futures.CancelledError("The pipeline was exited before the result was received"))
+
+    @override
+    def _run_cmd(self, cmd: Cmd) -> CmdHandle:
+        conn = self._client._conn_for(cmd)
+        buffer = self._buffers.get(conn)
+        if buffer is None:
+            buffer = self._buffers[conn] = self._client._buf_pool.acquire()
+        size = len(buffer)
+        buffer.write_using_id_map(self._client.reg_id_maps.cmd, type(cmd))
+        cmd._write(buffer, self._client)
+        self._buffered_size += len(buffer) - size
+
+        handle = CmdHandle(self, cmd, self._client._msg_queue._wait_for_result(cmd, _RUNNER.get_loop()))
+        self._pending.append(handle)
+        self._unsent += 1
+
+        if self._buffered_size >= self._flush_size:
+            self.flush()
+        return handle
+
+    def flush(self):
+        """Send the buffered commands now."""
+        if not self._buffers:
+            return
+        buffers, self._buffers = self._buffers, {}
+        self._buffered_size = 0
+        self._unsent = 0
+        _RUNNER.run(self._send(buffers))
+        for buffer in buffers.values():
+            self._client._buf_pool.release(buffer)
+
+    async def _send(self, buffers: dict[Connection, ByteBuf]):
+        await asyncio.gather(*(self._client.send_raw(buffer, conn) for conn, buffer in buffers.items()))
+
+    async def _wait_all(self, handles: list[CmdHandle]) -> list[Any]:
+        return await asyncio.gather(
+            *(self._client._run_cmd_coro(handle._waiter) for handle in handles),
+            return_exceptions=True
+        )
+
+    def _resolve(self, handle: CmdHandle):
+        # the handle is done afterward, whatever happens
+        result: Any = concurrent.futures.CancelledError("Interrupted while waiting for the result")
+        waited = False
+        try:
+            self.flush()
+            waited = True
+            result = _RUNNER.run(self._client._run_cmd_coro(handle._waiter))
+        except Exception as e:
+            result = e
+        finally:
+            if not waited:  # sending failed
+                self._client._msg_queue._discard_waiter(handle._cmd, handle._waiter)
+            try:
+                self._pending.remove(handle)
+            except ValueError:  # already dropped
+                pass
+            handle._set(result)
+
+
+@final
+class CmdHandle[T]:
+    """The result of a command run in a pipeline, which is only waited for when it's read."""
+
+    __slots__ = "_pipeline", "_cmd", "_waiter", "_done", "_result", "_exception", "_retrieved"
+
+    def __init__(self, pipeline: PipeliningCmdRunner, cmd: Cmd, waiter: Awaitable[CmdResultMsg]):
+        self._pipeline = pipeline
+        self._cmd = cmd
+        self._waiter = waiter
+        self._done = False
+        self._result: Optional[T] = None
+        self._exception: Optional[BaseException] = None
+        self._retrieved = False
+
+    def _set(self, result: T | BaseException):
+        self._done = True
+        if isinstance(result, BaseException):
+            self._exception = result
+        else:
+            self._result = result
+
+    def done(self) -> bool:
+        """Whether the result has been received (and read or waited for)."""
+        return self._done
+
+    def result(self) -> T:
+        """Wait for the result of the command, sends the buffered commands first.
+
+        Raises `CmdError` if the command failed,
+        or `concurrent.futures.CancelledError` if the pipeline was exited before the result was received.
+        """
+        if not self._done:
+            self._pipeline._resolve(self)
+        self._retrieved = True
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def __repr__(self):
+        if not self._done:
+            return "CmdHandle(<pending>)"
+        return f"CmdHandle({self._exception or self._result!r})"
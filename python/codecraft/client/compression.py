@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from typing import override, TYPE_CHECKING
+
+from websockets import frames
+from websockets.extensions.permessage_deflate import PerMessageDeflate, ClientPerMessageDeflateFactory
+
+from codecraft.config import CCConfig
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+    from typing import Optional
+
+    from websockets.extensions import Extension
+    from websockets.typing import ExtensionParameter
+
+__all__ = ("compression_extensions",)
+
+
+class _ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that sends messages smaller than a threshold uncompressed.
+
+    The extension allows any message to be sent uncompressed (without rsv1),
+    the receiver's context is only updated by compressed messages.
+    """
+
+    def __init__(self, *args, threshold: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._threshold = threshold
+        self._skipping = False
+
+    @override
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        if frame.opcode is not frames.OP_CONT:
+            # only whole messages can be measured, fragmented ones are always compressed
+            self._skipping = frame.fin and len(frame.data) < self._threshold
+        if self._skipping:
+            return frame
+        return super().encode(frame)
+
+
+class _ThresholdClientPerMessageDeflateFactory(ClientPerMessageDeflateFactory):
+    def __init__(self, *args, threshold: int, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._threshold = threshold
+
+    @override
+    def process_response_params(
+        self,
+        params: Sequence[ExtensionParameter],
+        accepted_extensions: Sequence[Extension],
+    ) -> PerMessageDeflate:
+        negotiated = super().process_response_params(params, accepted_extensions)
+        return _ThresholdPerMessageDeflate(
+            negotiated.remote_no_context_takeover,
+            negotiated.local_no_context_takeover,
+            negotiated.remote_max_window_bits,
+            negotiated.local_max_window_bits,
+            negotiated.compress_settings,
+            threshold=self._threshold
+        )
+
+
+def compression_extensions(
+    level: Optional[int] = None,
+    threshold: Optional[int] = None
+) -> list[ClientPerMessageDeflateFactory]:
+    """The websocket extensions offering compression to the server, `CCConfig`'s settings by default.
+
+    Whether frames are actually compressed is negotiated in the websocket handshake,
+    servers that don't support it (or have it disabled) just decline.
+    """
+    level = CCConfig.compression_level if level is None else level
+    threshold = CCConfig.compression_threshold if threshold is None else threshold
+    if level == 0:
+        return []
+    return [_ThresholdClientPerMessageDeflateFactory(
+        compress_settings={"level": level},
+        threshold=threshold
+    )]
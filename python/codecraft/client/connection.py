@@ -3,20 +3,91 @@ from __future__ import annotations
 import asyncio
 import threading
 from asyncio import AbstractEventLoop
-from typing import TYPE_CHECKING
+from collections import deque
+from typing import TYPE_CHECKING, override
 
 import websockets.asyncio
 from websockets.asyncio.client import ClientConnection
 from websockets.frames import CloseCode
+
+from codecraft.config import CCConfig
+from codecraft.coro import new_event_loop
+from codecraft.internal.error import NetworkError
 from codecraft.internal.typings import dummy_for_ide
 
 if TYPE_CHECKING:
-    from collections.abc import Buffer, Awaitable
+    from asyncio import Future
+    from collections.abc import Buffer, Awaitable, Iterable
+    from logging import Logger
+    from typing import Optional
 
     from codecraft.client import CCClient
 
 
-# TODO: uvloop?
+class _NetworkingThread:
+    """A thread running an event loop for connections, stopped once the last connection using it is closed."""
+
+    def __init__(self, name: str, logger: Logger):
+        self._logger = logger
+        self.loop: AbstractEventLoop = dummy_for_ide()
+        self._users = 0
+        self._users_lock = threading.Lock()
+
+        ready_event = threading.Event()
+
+        def thread_main():
+            self.loop = new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            ready_event.set()
+            logger.debug(f"Networking thread started")
+            self.loop.run_forever()
+            self.loop.close()
+
+        self._thread = threading.Thread(
+            target=thread_main,
+            name=name,
+            daemon=True
+        )
+
+        self._thread.start()
+        ready_event.wait()
+
+    def acquire(self):
+        with self._users_lock:
+            self._users += 1
+
+    def release(self) -> bool:
+        """Return whether the last user has been released, who should then call `stop()`."""
+        with self._users_lock:
+            self._users -= 1
+            return self._users == 0
+
+    async def _cancel_tasks(self):
+        current = asyncio.current_task()
+        for task in asyncio.all_tasks(self.loop):
+            if task is not current:
+                task.cancel()
+
+        # wait for tasks to complete (or terminate)
+        try:
+            async with asyncio.timeout(5):
+                while True:
+                    await asyncio.sleep(0)
+                    for task in asyncio.all_tasks(self.loop):
+                        if task is not current:
+                            if not task.done():
+                                break
+                    else:
+                        break
+        except TimeoutError:
+            self._logger.warning("Some tasks didn't finish in 5 seconds after being cancelled.")
+
+    async def stop(self):
+        """Cancel the remaining tasks and stop the thread, thread safe."""
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self.loop))
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()  # wait for event loop to terminate
+
 
 class Connection:
     """A stand-alone thread for networking.
@@ -26,77 +97,243 @@ class Connection:
     for example, the application can easily use a custom event loop implementation
     or start/stop event loops at any time while not influencing networking.
     (This is a problem because the `websockets` library doesn't support cross event loop usage.)
+
+    Outgoing messages are put in a queue that is drained by the networking thread,
+    messages queued during the same drain are coalesced into one websocket frame
+    (the server reads commands until the frame is exhausted),
+    so sending many commands concurrently doesn't cost a thread hop and a frame each.
     """
 
-    def __init__(self, client: CCClient, **kwargs):
+    def __init__(self, client: CCClient, *, share_thread_with: Optional[Connection] = None, **kwargs):
+        """
+        :param share_thread_with: run on the networking thread of another connection instead of starting one
+        """
         self._client = client
         self._kwargs = kwargs
         self._conn: ClientConnection = dummy_for_ide()
         self.loop: AbstractEventLoop = dummy_for_ide()
         self._closed = False
 
-        ready_event = threading.Event()
+        # (message, waiter), appended by any thread and only popped by the networking thread
+        self._send_queue: deque[tuple[Buffer, Optional[Future[None]]]] = deque()
+        # whether the sender has been woken up and hasn't started draining yet
+        self._send_scheduled = False
+        self._send_event: asyncio.Event = dummy_for_ide()
+        self._sender: asyncio.Task[None] = dummy_for_ide()
+        self._flush_window = CCConfig.send_flush_window
+        self._max_frame_size = CCConfig.max_frame_size
 
-        def thread_main():
-            self.loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(self.loop)
-            ready_event.set()
-            client.logger.debug(f"Networking thread started")
-            self.loop.run_forever()
-            self.loop.close()
-
-        self._thread = threading.Thread(
-            target=thread_main,
-            name=f"Networker({client.name})",
-            daemon=True
-        )
+        self._thread: Optional[_NetworkingThread] = None
+        self._use_thread(share_thread_with)
 
-        self._thread.start()
-        ready_event.wait()
+    def _use_thread(self, share_thread_with: Optional[Connection]):
+        if share_thread_with is not None:
+            self._thread = share_thread_with._thread
+        else:
+            self._thread = _NetworkingThread(f"Networker({self._client.name})", self._client.logger)
+        self._thread.acquire()
+        self.loop = self._thread.loop
 
     def connect(self) -> Awaitable[None]:
         assert not self._closed, "closed"
         async def _connect():
             self._conn = await websockets.asyncio.client.connect(**self._kwargs)
+            self._send_event = asyncio.Event()
+            self._sender = asyncio.create_task(self._sender_main(), name="Sender")
         return self._run(_connect())
 
-    def send(self, message: Buffer | str) -> Awaitable[None]:
-        return self._run(self._conn.send(message))
+    def send(self, message: Buffer) -> Awaitable[None]:
+        """Queue a binary message to be sent, thread safe.
+
+        `message` must not be modified until the returned awaitable is done.
+        """
+        if self._closed:
+            raise NetworkError("Connection closed")
+        waiter = asyncio.get_running_loop().create_future()
+        # deque.append() is atomic, so no lock is needed
+        self._send_queue.append((message, waiter))
+        if not self._send_scheduled:
+            # a redundant wakeup (when racing with other threads) is harmless
+            self._send_scheduled = True
+            self._wake_sender()
+        return waiter
+
+    def send_nowait(self, message: Buffer):
+        """Queue a binary message to be sent without waiting for it, thread safe and usable without an event loop.
+
+        Failing to send closes the connection, which is only noticed by waiting for the responses.
+        `message` must not be modified afterward.
+        """
+        if self._closed:
+            raise NetworkError("Connection closed")
+        self._send_queue.append((message, None))
+        if not self._send_scheduled:
+            self._send_scheduled = True
+            self._wake_sender()
+
+    def _wake_sender(self):
+        self.loop.call_soon_threadsafe(self._sender_woken)
+
+    def _sender_woken(self):
+        if self._sender.done():
+            # messages queued while the sender was stopping, nothing is going to send them
+            self._send_scheduled = False
+            self._fail_queued()
+        else:
+            self._send_event.set()
+
+    def _fail_queued(self):
+        queue = self._send_queue
+        waiters = []
+        # popped one by one, since other threads may still be appending
+        while queue:
+            waiters.append(queue.popleft()[1])
+        _notify_waiters(waiters, asyncio.CancelledError("Connection closed"))
+
+    async def _sender_main(self):
+        queue = self._send_queue
+        try:
+            while True:
+                await self._send_event.wait()
+                self._send_event.clear()
+                if self._flush_window > 0:
+                    await asyncio.sleep(self._flush_window)
+                # reset before draining, messages queued after this either get drained or wake up the sender again
+                self._send_scheduled = False
+                while queue:
+                    frame, waiters = self._take_frame()
+                    try:
+                        await self._conn.send(frame)
+                        # the senders may reuse (resize) their buffers once notified, the view mustn't outlive that
+                        del frame
+                    except BaseException as e:
+                        _notify_waiters(waiters, e)
+                        if not isinstance(e, Exception):
+                            raise
+                    else:
+                        _notify_waiters(waiters, None)
+        finally:
+            # messages queued from now on wake up `_sender_woken()` instead, which fails them
+            self._send_scheduled = False
+            self._fail_queued()
+
+    def _take_frame(self) -> tuple[Buffer, list[Optional[Future[None]]]]:
+        """Pop queued messages that fit in one frame, a message larger than the max frame size is sent alone."""
+        queue = self._send_queue
+        message, waiter = queue.popleft()
+        if not queue:
+            return message, [waiter]
+
+        messages = [message]
+        waiters = [waiter]
+        size = len(message)
+        limit = self._max_frame_size
+        while queue and size + len(queue[0][0]) <= limit:
+            message, waiter = queue.popleft()
+            messages.append(message)
+            waiters.append(waiter)
+            size += len(message)
+        return b"".join(messages), waiters
 
     def recv(self) -> Awaitable[bytes | str]:
         return self._run(self._conn.recv())
 
     async def close(self, code=CloseCode.NORMAL_CLOSURE, reason=""):
-        """Close the connection and stop the thread, thread safe."""
+        """Close the connection, and stop the thread if no other connection uses it, thread safe."""
 
         assert not self._closed, "closed"
         self._closed = True
 
         async def stop():
             await self._conn.close(code, reason)
-            current = asyncio.current_task()
-            for task in asyncio.all_tasks(self.loop):
-                if task is not current:
-                    task.cancel()
-
-            # wait for tasks to complete (or terminate)
-            try:
-                async with asyncio.timeout(5):
-                    while True:
-                        await asyncio.sleep(0)
-                        for task in asyncio.all_tasks(self.loop):
-                            if task is not current:
-                                if not task.done():
-                                    break
-                        else:
-                            break
-            except TimeoutError:
-                self._client.logger.warning("Some tasks didn't finish in 5 seconds after being cancelled.")
+            self._sender.cancel()
 
         await self._run(stop())
-        self.loop.call_soon_threadsafe(self.loop.stop)
-        self._thread.join()  # wait for event loop to terminate
+        # released only after closing, so that the last one doesn't cancel the closing of the others
+        if self._thread.release():
+            await self._thread.stop()
 
     def _run[T](self, coro: Awaitable[T]) -> Awaitable[T]:
-        # TODO: optimize cross-thread coroutine?
         return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, self.loop))
+
+
+class LoopBoundConnection(Connection):
+    """A connection without a networking thread, bound to the event loop it is connected from.
+
+    Used by clients in same-loop mode, which saves the thread hops of every send and receive
+    when the application is async anyway.
+    Sending and receiving are only possible from coroutines running on the bound loop.
+    """
+
+    @override
+    def _use_thread(self, share_thread_with: Optional[Connection]):
+        pass  # the loop is bound on connect()
+
+    @override
+    def connect(self) -> Awaitable[None]:
+        assert not self._closed, "closed"
+        self.loop = asyncio.get_running_loop()
+        return super().connect()
+
+    @override
+    def _wake_sender(self):
+        if asyncio.get_running_loop() is self.loop:
+            self._sender_woken()
+        else:
+            super()._wake_sender()
+
+    @override
+    async def close(self, code=CloseCode.NORMAL_CLOSURE, reason=""):
+        """Close the connection, only does anything when called from the bound loop."""
+
+        assert not self._closed, "closed"
+        self._closed = True
+
+        if asyncio.get_running_loop() is not self.loop:
+            # e.g. closing at exit after the application's event loop has stopped
+            self._client.logger.debug("Connection closed outside of its event loop, abandoning it")
+            return
+
+        await self._conn.close(code, reason)
+        self._sender.cancel()
+        try:
+            await self._sender
+        except asyncio.CancelledError:
+            pass
+
+    @override
+    def _run[T](self, coro: Awaitable[T]) -> Awaitable[T]:
+        if asyncio.get_running_loop() is not self.loop:
+            coro.close()
+            raise NetworkError("The connection of a same-loop client can only be used from its event loop")
+        return coro
+
+
+def _notify_waiters(waiters: Iterable[Optional[Future[None]]], exc: Optional[BaseException]):
+    """Complete send waiters with one wakeup per event loop."""
+    by_loop: dict[AbstractEventLoop, list[Future[None]]] = {}
+    for waiter in waiters:
+        if waiter is None:  # queued with send_nowait()
+            continue
+        by_loop.setdefault(waiter.get_loop(), []).append(waiter)
+    current = asyncio.get_running_loop()
+    for loop, futs in by_loop.items():
+        if loop is current:
+            _complete_all(futs, exc)
+            continue
+        try:
+            loop.call_soon_threadsafe(_complete_all, futs, exc)
+        except RuntimeError:  # the loop has been closed, nobody is waiting anymore
+            pass
+
+
+def _complete_all(futs: list[Future[None]], exc: Optional[BaseException]):
+    for fut in futs:
+        if fut.done():
+            continue
+        if exc is None:
+            fut.set_result(None)
+        elif isinstance(exc, asyncio.CancelledError):
+            fut.cancel(*exc.args)
+        else:
+            fut.set_exception(exc)
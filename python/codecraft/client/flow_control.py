@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import final, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from asyncio import Future
+    from typing import Optional
+
+__all__ = ("FlowControl",)
+
+
+@final
+class _Waiter:
+    __slots__ = "fut", "granted"
+
+    def __init__(self, fut: Future[None]):
+        self.fut = fut
+        self.granted = False
+
+
+@final
+class FlowControl:
+    """Bounds the number of commands in flight, with a window adapted to the measured round trip time.
+
+    The window follows the gradient between the long-term average command round trip time
+    and the average of the latest sampling window (like Netflix's concurrency-limits "Gradient2"):
+    it grows while the round trip time stays near its long-term average,
+    and shrinks when it rises, which means that commands are queueing up at the server.
+    Samples are aggregated over about a round trip, so the window is adjusted once per round trip.
+    Until the round trip time rises for the first time, the window doubles every round trip (like TCP's slow start).
+    Commands wait for a free slot when the window is full, so memory stays bounded.
+
+    Thread safe, the commands may be run from any event loop.
+    """
+
+    MIN_WINDOW = 8
+    INITIAL_WINDOW = 64
+    # how much the short-term round trip time may exceed the long-term one before the window shrinks
+    TOLERANCE = 1.5
+    # samples aggregated before adjusting the window, at least
+    MIN_SAMPLES = 10
+    # weight of a sampling window in the long-term round trip time, and of the new window size
+    LONG_SMOOTHING = 1 / 100
+    WINDOW_SMOOTHING = 0.2
+
+    def __init__(self, max_window: int):
+        self._max_window = max(max_window, self.MIN_WINDOW)
+        self._window = float(min(self.INITIAL_WINDOW, self._max_window))
+        self._in_flight = 0
+        self._slow_start = True
+        self._short_rtt: Optional[float] = None
+        self._long_rtt: Optional[float] = None
+        # the current sampling window
+        self._sample_start = time.perf_counter()
+        self._sample_sum = 0.0
+        self._sample_count = 0
+        self._sample_max_in_flight = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def window(self) -> int:
+        """The current number of commands allowed in flight."""
+        return int(self._window)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def rtt(self) -> Optional[float]:
+        """The average command round trip time of the last sampling window in seconds."""
+        return self._short_rtt
+
+    async def acquire(self):
+        """Wait for a free slot in the window, must be followed by `release()`."""
+        with self._lock:
+            if self._in_flight < self._window and not self._waiters:
+                self._in_flight += 1
+                return
+            waiter = _Waiter(asyncio.get_running_loop().create_future())
+            self._waiters.append(waiter)
+
+        try:
+            await waiter.fut
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = waiter.granted
+                if not granted:
+                    self._waiters.remove(waiter)
+            if granted:  # the slot was handed over before the cancellation took effect
+                self.release()
+            raise
+
+    def release(self, rtt: Optional[float] = None):
+        """Free a slot, `rtt` is the round trip time of the command if it completed."""
+        granted: list[_Waiter] = []
+        with self._lock:
+            if rtt is not None:
+                self._sample(rtt)
+            self._in_flight -= 1
+            while self._waiters and self._in_flight < self._window:
+                waiter = self._waiters.popleft()
+                waiter.granted = True
+                self._in_flight += 1
+                granted.append(waiter)
+
+        # noinspection PyUnresolvedReferences,PyProtectedMember
+        current = asyncio._get_running_loop()
+        for waiter in granted:
+            loop = waiter.fut.get_loop()
+            if loop is current:
+                _grant(waiter.fut)
+                continue
+            try:
+                loop.call_soon_threadsafe(_grant, waiter.fut)
+            except RuntimeError:  # the loop has been closed, nobody is waiting anymore
+                self.release()
+
+    def _sample(self, rtt: float):
+        self._sample_sum += rtt
+        self._sample_count += 1
+        self._sample_max_in_flight = max(self._sample_max_in_flight, self._in_flight)
+
+        now = time.perf_counter()
+        if self._sample_count < self.MIN_SAMPLES or now - self._sample_start < (self._short_rtt or 0.0):
+            return
+        short = self._sample_sum / self._sample_count
+        max_in_flight = self._sample_max_in_flight
+        self._sample_start = now
+        self._sample_sum = 0.0
+        self._sample_count = 0
+        self._sample_max_in_flight = 0
+        self._adjust(short, max_in_flight)
+
+    def _adjust(self, short: float, max_in_flight: int):
+        self._short_rtt = short
+        if self._long_rtt is None:
+            self._long_rtt = short
+            return
+        if self._slow_start:
+            # the baseline is the fastest round trip seen while the window is small
+            self._long_rtt = min(self._long_rtt, short)
+        else:
+            self._long_rtt += (short - self._long_rtt) * self.LONG_SMOOTHING
+        # recover quickly after a period of queueing, so that it doesn't become the new normal
+        if self._long_rtt > short * 2:
+            self._long_rtt *= 0.95
+
+        # an underused window says nothing about the capacity
+        if max_in_flight < self._window / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.TOLERANCE * self._long_rtt / short))
+        if self._slow_start:
+            if gradient == 1.0:
+                self._window = min(self._max_window, self._window * 2)
+                return
+            self._slow_start = False
+        target = self._window * gradient + math.sqrt(self._window)
+        window = self._window + (target - self._window) * self.WINDOW_SMOOTHING
+        self._window = max(self.MIN_WINDOW, min(self._max_window, window))
+
+
+def _grant(fut: Future[None]):
+    if not fut.done():
+        fut.set_result(None)
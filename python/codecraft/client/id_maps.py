@@ -1,85 +1,205 @@
 from __future__ import annotations
 
-import json
-
+import mmap
+import os
+import threading
+from struct import Struct
 from typing import final, TYPE_CHECKING
 
 from codecraft.internal.resource import ResLoc
-from codecraft.internal.id_map import RegistryIdMap
+from codecraft.internal.byte_buf.byte_buf import ByteBuf
+from codecraft.internal.id_map import RegistryIdMap, BlockStateIdMap
 from codecraft.internal.meta_folder import meta_path, should_write_meta_folder
 from codecraft.log.log import LOGGER
 
 if TYPE_CHECKING:
-    from typing import Optional, Self
-    from codecraft.internal.byte_buf.byte_buf import ByteBuf
+    from pathlib import Path
+    from typing import Optional, Self, Any
 
     from codecraft.client import CCClient
+    from codecraft.internal.cmd.cmd import Cmd
+    from codecraft.internal.msg.msg import Msg
+    from codecraft.block.block import Block
+    from codecraft.world.world import World
 
 CACHE_DIR = "registryIdMapCache"
 
+# magic, format version, checksum of the sync packets; followed by the raw sync packets received from the server
+_CACHE_HEADER = Struct("!8sBQ")
+_CACHE_MAGIC = b"CCRIDMAP"
+_CACHE_VERSION = 2
+
 
 @final
 class RegistryIdMaps:
-    def __init__(self, client: CCClient):
-        self._client = client
+    """The registry id maps synced from the server.
 
-        self._maps: dict[ResLoc, RegistryIdMap] = {}
-        def add[T, R](m: RegistryIdMap[T, R]) -> RegistryIdMap[T, R]:
-            self._maps[m.name] = m
-            return m
+    The sync packets are only indexed when received,
+    each registry is decoded (and frozen) the first time its id map is accessed.
+    """
+
+    cmd: RegistryIdMap[Cmd, type[Cmd]]
+    msg: RegistryIdMap[Msg, type[Msg]]
+    block: RegistryIdMap[Block, Block]
+    item: RegistryIdMap[Any, Any]
+    entity: RegistryIdMap[Any, Any]
+    world: RegistryIdMap[World, World]
+    block_state: BlockStateIdMap
+
+    def __init__(self, client: CCClient, sync_packets: ByteBuf, *, mapping: Optional[mmap.mmap] = None):
+        """
+        :param sync_packets: the sync packets, the id maps keep views of its buffer until they are decoded
+        :param mapping: the memory mapping of the cache file backing `sync_packets`,
+            closed once every id map has been decoded
+        """
+        self._client = client
+        self._mapping = mapping
+        # reentrant, since decoding the block states accesses the block id map
+        self._decode_lock = threading.RLock()
 
         from codecraft.internal.cmd.cmd import Cmd
         from codecraft.internal.msg.msg import Msg
         from codecraft.block.block import Block
         from codecraft.world.world import World
 
-        self.cmd = add(RegistryIdMap(Cmd.registry))
-        self.msg = add(RegistryIdMap(Msg.registry))
-        self.block = add(RegistryIdMap(Block.registry))
-        self.item = add(RegistryIdMap("item"))
-        self.entity = add(RegistryIdMap("entity_type"))
-        self.world = add(RegistryIdMap(World.registry))
-
-    def read_sync_packet(self, buf: ByteBuf):
-        name = buf.read_resloc()
-        self._client.logger.debug(f"Reading registry id map: {name}")
-        id_map = self._maps.get(name)
-        if id_map is None:
-            self._client.logger.warning(f"Received registry id map sync packet with unknown registry {name}")
-        for _ in range(buf.read_uvarint()):
-            id = buf.read_varint()
-            reg_name = buf.read_resloc()
-            if id_map is not None:
-                id_map.put(id, reg_name)
-
-    def save_cache(self, name: str):
+        # attribute name -> id map, removed once decoded (and set as an actual attribute)
+        self._pending: dict[str, RegistryIdMap | BlockStateIdMap] = {
+            "cmd": RegistryIdMap(Cmd.registry),
+            "msg": RegistryIdMap(Msg.registry),
+            "block": RegistryIdMap(Block.registry),
+            "item": RegistryIdMap("item"),
+            "entity": RegistryIdMap("entity_type"),
+            "world": RegistryIdMap(World.registry),
+        }
+        self._pending["block_state"] = BlockStateIdMap(self._pending["block"])
+        # attribute name -> the error of decoding it, raised again on every access instead of a partial id map
+        self._errors: dict[str, Exception] = {}
+
+        self._sections: dict[ResLoc, memoryview] = {}
+        while sync_packets.remaining:
+            name = sync_packets.read_resloc()
+            self._sections[name] = sync_packets.read_blob(view=True)
+        known = {m.name if isinstance(m, RegistryIdMap) else m.SYNC_NAME for m in self._pending.values()}
+        for name in self._sections.keys() - known:
+            client.logger.warning(f"Received registry id map sync packet with unknown registry {name}")
+
+    def __getattr__(self, name: str):
+        # only called for id maps that haven't been decoded yet,
+        # the instance dict is used directly since missing attributes would recurse into here
+        state = self.__dict__
+        decode_lock = state.get("_decode_lock")
+        if decode_lock is None:  # not initialized
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        with decode_lock:
+            if name in state:  # decoded by another thread in the meantime
+                return state[name]
+            id_map = state["_pending"].get(name)
+            if id_map is None:
+                raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+            if (error := state["_errors"].get(name)) is not None:
+                raise ValueError(f"Failed to decode the {name} registry id map") from error
+            try:
+                self._decode(id_map)
+            except Exception as e:
+                self._errors[name] = e
+                raise
+            setattr(self, name, id_map)
+            del self._pending[name]
+            if not self._pending:
+                self._release_sections()
+            return id_map
+
+    def _release_sections(self):
+        """Drop the remaining views of the sync packets (e.g. of unknown registries) and close the mapping."""
+        for section in self._sections.values():
+            section.release()
+        self._sections.clear()
+        if self._mapping is not None:
+            try:
+                self._mapping.close()
+            except BufferError:  # a view is still referenced somewhere, it's unmapped once that's gone
+                pass
+            self._mapping = None
+
+    def _decode(self, id_map: RegistryIdMap | BlockStateIdMap):
+        if isinstance(id_map, BlockStateIdMap):
+            _ = self.block  # the block state id map resolves blocks through it
+            section = self._sections.pop(BlockStateIdMap.SYNC_NAME, None)
+            if section is not None:
+                id_map.read_sync_packet(ByteBuf(section, client=self._client))
+            return
+
+        section = self._sections.pop(id_map.name, None)
+        self._client.logger.debug(f"Decoding registry id map: {id_map.name}")
+        if section is None:
+            self._client.logger.warning(f"Registry {id_map.name} was not synced by the server")
+        else:
+            entries = ByteBuf(section, client=self._client).read_varint_ascii_pairs()
+            id_map.put_all([(id, ResLoc(name)) for id, name in entries])
+        id_map.freeze()
+
+    def decode_all(self) -> Self:
+        """Decode all the id maps now instead of on first access, which also closes the mapping of a cache file."""
+        for name in tuple(self._pending):
+            getattr(self, name)
+        return self
+
+    @staticmethod
+    def _cache_file(checksum: int) -> Path:
+        return meta_path(f"{CACHE_DIR}/{checksum:016X}.bin")
+
+    @staticmethod
+    def save_cache(checksum: int, sync_packets: ByteBuf):
+        """Save the raw sync packets, the file is replaced atomically to never leave a partial cache behind."""
         try:
             if not should_write_meta_folder():
                 return
-            file = meta_path(f"{CACHE_DIR}/{name}.json")
+            file = RegistryIdMaps._cache_file(checksum)
             file.parent.mkdir(exist_ok=True)
-            with file.open("wt", encoding="utf8") as f:
-                json.dump(
-                    {str(k): m.to_json_dict() for k, m in self._maps.items()},
-                    f,
-                    ensure_ascii=False,
-                    indent=4
-                )
-        except (IOError, ValueError) as e:
+            tmp = file.with_suffix(".tmp")
+            with tmp.open("wb") as f:
+                f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, checksum))
+                f.write(sync_packets.full_view)
+            os.replace(tmp, file)
+        except OSError as e:
             LOGGER.warn(f"Failed to save registry id map cache: {e}")
 
     @classmethod
-    def load_cache(cls, name: str, client: CCClient) -> Optional[Self]:
+    def load_cache(cls, checksum: int, client: CCClient) -> Optional[Self]:
+        """Load the cached sync packets (memory-mapped), verified against `checksum`.
+
+        The id maps keep views of the mapping, it's closed once every id map has been decoded
+        (see `decode_all()`), the cache file can't be replaced before that on some platforms.
+        """
         try:
-            file = meta_path(f"{CACHE_DIR}/{name}.json")
+            file = cls._cache_file(checksum)
             if not file.is_file():
                 return None
-            with file.open("rt", encoding="utf8") as f:
-                data = json.load(f)
-            obj = cls(client)
-            for k, m in obj._maps.items():
-                m.from_json_dict(data[str(k)], freeze=True)
-            return obj
-        except (IOError, ValueError) as e:
-            LOGGER.debug(f"Failed to load registry id map <{name}>: {e}")
+            with file.open("rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except OSError as e:
+            LOGGER.debug(f"Failed to load registry id map cache <{checksum:016X}>: {e}")
+            return None
+
+        view = memoryview(mm)
+        buf = None
+        try:
+            if len(view) < _CACHE_HEADER.size:
+                raise ValueError("Truncated file")
+            magic, version, file_checksum = _CACHE_HEADER.unpack_from(view)
+            if magic != _CACHE_MAGIC or version != _CACHE_VERSION:
+                raise ValueError(f"Unsupported format")
+            buf = ByteBuf(view[_CACHE_HEADER.size:], client=client)
+            if file_checksum != checksum or buf.checksum() != checksum:
+                raise ValueError("Checksum mismatch")
+            return cls(client, buf, mapping=mm)
+        except (ValueError, KeyError) as e:
+            LOGGER.debug(f"Failed to load registry id map cache <{checksum:016X}>: {e}")
+            # unmapped before the cache file gets replaced
+            del buf
+            view.release()
+            try:
+                mm.close()
+            except BufferError:  # views of a partially decoded sync packet, unmapped once they are collected
+                pass
             return None
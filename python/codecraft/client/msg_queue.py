@@ -3,6 +3,8 @@ from __future__ import annotations
 import asyncio
 import threading
 from asyncio import CancelledError
+from concurrent.futures import Future as ConcurrentFuture
+from contextlib import nullcontext
 from typing import TYPE_CHECKING, Any
 
 from websockets.frames import CloseCode
@@ -15,39 +17,69 @@ from codecraft.internal.typings import dummy_for_ide
 if TYPE_CHECKING:
     from typing import Optional
     from asyncio import Future, AbstractEventLoop
-    from collections.abc import Awaitable
+    from collections.abc import Awaitable, Callable, Iterable
 
     from codecraft.client import CCClient
+    from codecraft.client.connection import Connection
+    from codecraft.client.subscription import Subscription
     from codecraft.internal.cmd import Cmd
     from codecraft.internal.msg import Msg
 
 
 # noinspection PyProtectedMember
 class MsgQueue:
-    def __init__(self, client: CCClient):
+    def __init__(self, client: CCClient, *, threaded: bool = True):
+        """
+        :param threaded: whether the receiver runs on a networking thread,
+            otherwise everything happens on one event loop, so the waiters don't need a lock or thread safe wakeups
+        """
         self._client = client
         self._loop: AbstractEventLoop = dummy_for_ide()
 
         # A result waiter is guaranteed to be added here before the command is sent to the server.
         # (Unless the command result is intended to be discarded)
         self._running_cmds: dict[int, Cmd] = {}
-        self._result_waiters: dict[int, Future[CmdResultMsg]] = {}
-        self._waiters_lock = threading.Lock()
+        # asyncio futures, or concurrent futures for blocking waiters (see `_wait_for_result_blocking()`)
+        self._result_waiters: dict[int, Future[CmdResultMsg] | ConcurrentFuture[CmdResultMsg]] = {}
+        self._waiters_lock = threading.Lock() if threaded else nullcontext()
+        # uids of sent commands whose waiter ended before the result arrived (e.g. a timeout),
+        # the results are skipped when they arrive (see `_pop_running_cmd()`)
+        self._abandoned_cmds: set[int] = set()
+        # set by `_stop()`, no waiters can be added afterward since nothing would cancel them
+        self._stopped = False
 
-        self._receiver: asyncio.Task[None]
+        # one for every connection of the client, the results of all of them are dispatched here
+        self._receivers: list[asyncio.Task[None]] = []
 
-    async def _receiver_main(self):
+        # replaced (not modified) when changed, so that the receiver can read them without locking
+        self._subscriptions: tuple[Subscription, ...] = ()
+        # message type -> the subscriptions of it or its base classes, filled in by the receiver when missing
+        self._dispatch: dict[type[Msg], tuple[Subscription, ...]] = {}
+        self._subscriptions_lock = threading.Lock()
+
+    async def _receiver_main(self, conn: Connection):
         client = self._client
         set_task_name("MsgReceiver")
         client._logger.debug("Message receiver started")
         while True:
             try:
-                data = await client.recv_raw()
+                data = await client.recv_raw(conn)
+                # the results of a frame are dispatched together, see `__put_results()`,
+                # and the subscribers that received messages are woken up once
+                results: list[CmdResultMsg] = []
+                woken: set[Subscription] = set()
                 while data.remaining:
                     msg_type = data.read_using_id_map(client.reg_id_maps.msg)
                     msg = msg_type(data, client)
 
-                    self.__put(msg)
+                    if isinstance(msg, CmdResultMsg):
+                        results.append(msg)
+                    else:
+                        self.__put(msg, woken)
+                if results:
+                    self.__put_results(results)
+                for sub in woken:
+                    sub._wake()
             except CancelledError:
                 raise
             except NetworkError as e:
@@ -63,39 +95,105 @@ class MsgQueue:
 
     async def _start(self):
         self._loop = asyncio.get_running_loop()
-        self._receiver = self._loop.create_task(self._receiver_main())
+        self._stopped = False
+        self._receivers = [self._loop.create_task(self._receiver_main(conn)) for conn in self._client._conns]
 
     def _stop(self):
         """Stop the message listener coroutine and cancel all awaiting things, thread safe."""
 
+        with self._subscriptions_lock:
+            subs, self._subscriptions = self._subscriptions, ()
+            self._dispatch = {}
+        for sub in subs:
+            sub._close()
+
         with self._waiters_lock:
+            self._stopped = True
+            if self._loop.is_closed():  # same-loop mode, the application's loop has already stopped
+                return
             for fut in self._result_waiters.values():
-                fut.get_loop().call_soon_threadsafe(fut.cancel, "Message queue closed")
+                if isinstance(fut, ConcurrentFuture):
+                    fut.cancel()
+                else:
+                    fut.get_loop().call_soon_threadsafe(fut.cancel, "Message queue closed")
 
         async def cancel():
-            self._receiver.cancel()
-            try:
-                await self._receiver
-            except CancelledError:
-                pass
+            for receiver in self._receivers:
+                receiver.cancel()
+            for receiver in self._receivers:
+                try:
+                    await receiver
+                except CancelledError:
+                    pass
             with self._waiters_lock:
                 self._result_waiters.clear()
+                self._abandoned_cmds.clear()
 
         asyncio.run_coroutine_threadsafe(cancel(), self._loop)
 
-    def __put(self, msg: Msg):
-        if isinstance(msg, CmdResultMsg):
-            with self._waiters_lock:
+    def __put_results(self, results: list[CmdResultMsg]):
+        """Complete the waiters of some command results with one lock acquisition and one wakeup per event loop."""
+        by_loop: dict[AbstractEventLoop, list[tuple[Future[CmdResultMsg], CmdResultMsg]]] = {}
+        blocking: list[tuple[ConcurrentFuture[CmdResultMsg], CmdResultMsg]] = []
+        with self._waiters_lock:
+            for msg in results:
                 if fut := self._result_waiters.get(msg.cmd_uid):
-                    fut.get_loop().call_soon_threadsafe(_safe_set_result, fut, msg)
-        else:
-            ...
-            # TODO: msg handling
+                    if isinstance(fut, ConcurrentFuture):
+                        blocking.append((fut, msg))
+                    else:
+                        by_loop.setdefault(fut.get_loop(), []).append((fut, msg))
+
+        for fut, msg in blocking:
+            # may be cancelled by `_stop()` from another thread
+            if fut.set_running_or_notify_cancel():
+                fut.set_result(msg)
+        for loop, group in by_loop.items():
+            if loop is self._loop:
+                _set_results(group)
+                continue
+            try:
+                loop.call_soon_threadsafe(_set_results, group)
+            except RuntimeError:  # the loop has been closed, nobody is waiting anymore
+                pass
+
+    def __put(self, msg: Msg, woken: set[Subscription]):
+        """Queue a message in its subscriptions, which never waits (see `OverflowPolicy`)."""
+        subs = self._dispatch.get(type(msg))
+        if subs is None:
+            subs = self.__resolve_subscriptions(type(msg))
+        for sub in subs:
+            sub._offer(msg)
+            woken.add(sub)
+
+    def __resolve_subscriptions(self, msg_type: type[Msg]) -> tuple[Subscription, ...]:
+        with self._subscriptions_lock:
+            subs = tuple(sub for sub in self._subscriptions if issubclass(msg_type, sub.msg_type))
+            self._dispatch[msg_type] = subs
+        return subs
+
+    def _subscribe(self, sub: Subscription):
+        with self._subscriptions_lock:
+            self._subscriptions += (sub,)
+            self._dispatch = {}
+
+    def _unsubscribe(self, sub: Subscription):
+        with self._subscriptions_lock:
+            self._subscriptions = tuple(s for s in self._subscriptions if s is not sub)
+            self._dispatch = {}
 
     def _pop_running_cmd(self, id: int) -> Optional[Cmd]:
-        return self._running_cmds.pop(id, None)
+        """The command of a received result, None if its result isn't waited for anymore."""
+        cmd = self._running_cmds.pop(id, None)
+        if cmd is None:
+            # the lock makes sure that an abandoned command is in the set by now, see `__remove_waiter()`
+            with self._waiters_lock:
+                if id in self._abandoned_cmds:
+                    self._abandoned_cmds.remove(id)
+                else:
+                    self._client._logger.warning(f"Received the result of an unknown command (uid {id}), skipped")
+        return cmd
 
-    def _wait_for_result(self, cmd: Cmd) -> Awaitable[CmdResultMsg]:
+    def _wait_for_result(self, cmd: Cmd, loop: Optional[AbstractEventLoop] = None) -> Awaitable[CmdResultMsg]:
         """Wait for a command result to arrive and return it.
 
         If the result has already received, return it immediately.
@@ -105,22 +203,64 @@ class MsgQueue:
         ensures that the waiter gets added to self._result_waiters
         immediately upon calling this, avoiding some race conditions
         when the server responds too quickly.
+
+        :param loop: the loop to wait on, the running loop by default
+        """
+        fut = (loop or asyncio.get_running_loop()).create_future()
+        self.__add_waiter(cmd, fut)
+        return self.__wait_for_result(cmd._uid, fut)
+
+    def _wait_for_result_blocking(self, cmd: Cmd, send: Callable[[], None]) -> CmdResultMsg:
+        """Like `_wait_for_result()`, but block the calling thread instead of an event loop.
+
+        `send` is called to send the command once the waiter is registered.
+        Only for threaded clients, the result is set directly by the networking thread.
         """
-        fut = asyncio.get_running_loop().create_future()
-        self._running_cmds[cmd._uid] = cmd
+        fut = ConcurrentFuture()
+        uid = cmd._uid
+        self.__add_waiter(cmd, fut)
+        sent = False
+        try:
+            send()
+            sent = True
+            return fut.result()
+        finally:
+            self.__remove_waiter(uid, sent)
+
+    def __add_waiter(self, cmd: Cmd, fut: Future[CmdResultMsg] | ConcurrentFuture[CmdResultMsg]):
         with self._waiters_lock:
+            if self._stopped:
+                raise NetworkError("Client closed")
+            self._running_cmds[cmd._uid] = cmd
             self._result_waiters[cmd._uid] = fut
-        return self.__wait_for_result(cmd, fut)
 
-    async def __wait_for_result(self, cmd: Cmd, fut: Future[CmdResultMsg]) -> CmdResultMsg:
+    def _discard_waiter(self, cmd: Cmd, waiter: Awaitable[CmdResultMsg], sent: bool = True):
+        """Forget a waiter from `_wait_for_result()` that won't be awaited (anymore).
+
+        :param sent: whether the command may have been sent, its result is skipped when it arrives then
+        """
+        waiter.close()
+        self.__remove_waiter(cmd._uid, sent)
+
+    async def __wait_for_result(self, uid: int, fut: Future[CmdResultMsg]) -> CmdResultMsg:
         try:
             return await fut
         finally:
-            with self._waiters_lock:
-                if cmd._uid in self._result_waiters:
-                    del self._result_waiters[cmd._uid]
+            self.__remove_waiter(uid)
+
+    def __remove_waiter(self, uid: int, sent: bool = True):
+        """Forget a waiter that has ended.
+
+        If the result hasn't arrived (e.g. cancelled or timed out), the command is abandoned if it may have been sent,
+        so that its result is skipped when it arrives, instead of being an error.
+        """
+        with self._waiters_lock:
+            self._result_waiters.pop(uid, None)
+            if self._running_cmds.pop(uid, None) is not None and sent:
+                self._abandoned_cmds.add(uid)
 
 
-def _safe_set_result(fut: Future, result: Any):
-    if not fut.cancelled():
-        fut.set_result(result)
+def _set_results(results: Iterable[tuple[Future, Any]]):
+    for fut, result in results:
+        if not fut.cancelled():
+            fut.set_result(result)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import asyncio
+import enum
+import itertools
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future as ConcurrentFuture
+from typing import final, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from asyncio import Future
+    from collections.abc import Callable, Hashable
+    from typing import Optional
+
+    from codecraft.client.msg_queue import MsgQueue
+    from codecraft.coro.coro import MaybeAwaitable
+    from codecraft.internal.msg import Msg
+
+__all__ = ("OverflowPolicy", "Subscription", "SubscriptionOverflowError")
+
+
+class OverflowPolicy(enum.Enum):
+    """What a `Subscription` does with a new message when its queue is full.
+
+    None of them waits for room: the messages of every subscription and the command results are received
+    on the same connection, and the server can't be told to hold back only some of them, so waiting for
+    one slow consumer would stall all the others. `FAIL` is the choice for consumers that can't miss any message.
+    """
+
+    DROP_OLDEST = enum.auto()
+    """Discard the oldest queued message."""
+    COALESCE = enum.auto()
+    """Replace the queued message with the same `Msg._coalesce_key()` (whether full or not), drop the oldest otherwise."""
+    FAIL = enum.auto()
+    """Close the subscription, its consumer gets a `SubscriptionOverflowError` after the queued messages.
+
+    Never loses a message silently, use a larger `maxsize` if it happens under normal load.
+    """
+
+
+class SubscriptionOverflowError(RuntimeError):
+    """The queue of a subscription with `OverflowPolicy.FAIL` overflowed, so it was closed."""
+
+
+# noinspection PyProtectedMember
+@final
+class Subscription[T: Msg]:
+    """The messages of a type (including subclasses) pushed by the server, see `CCClient.subscribe()`.
+
+    The messages are queued in a bounded queue, which is handled according to the `OverflowPolicy` when full,
+    so that a slow subscriber never holds up the receiver or grows without limit.
+    Iterate it with `async for` or `for` until it's closed, by `close()` or when the client closes.
+    Thread safe, but meant for a single consumer.
+    """
+
+    def __init__(self, msg_queue: MsgQueue, msg_type: type[T], maxsize: int, overflow: OverflowPolicy):
+        self._msg_queue = msg_queue
+        self._msg_type = msg_type
+        self._maxsize = max(1, maxsize)
+        self._overflow = overflow
+        # in arrival order, keyed by `(coalescing key,)` or by a sequence number for messages that aren't coalesced
+        self._queue: OrderedDict[Hashable, T] = OrderedDict()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        # the consumer waiting for a message (a concurrent future when blocking a thread)
+        self._getter: Optional[Future[None] | ConcurrentFuture[None]] = None
+        self._closed = False
+        # raised to the consumer once the queue is empty, instead of just ending
+        self._error: Optional[BaseException] = None
+        self._dropped = 0
+
+    @property
+    def msg_type(self) -> type[T]:
+        return self._msg_type
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def dropped(self) -> int:
+        """The number of messages discarded (or coalesced) because the queue was full."""
+        return self._dropped
+
+    def __len__(self):
+        return len(self._queue)
+
+    def _offer(self, msg: T):
+        """Queue a message, called by the receiver, never waits."""
+        with self._lock:
+            if self._closed:
+                return
+            key = None
+            if self._overflow is OverflowPolicy.COALESCE and (key := msg._coalesce_key()) is not None:
+                key = (key,)
+                if key in self._queue:
+                    self._queue[key] = msg  # keeps the position of the replaced message
+                    self._dropped += 1
+                    return
+            full = len(self._queue) >= self._maxsize
+            if full:
+                self._dropped += 1
+            if not (full and self._overflow is OverflowPolicy.FAIL):
+                if full:
+                    self._queue.popitem(last=False)
+                self._queue[key if key is not None else next(self._seq)] = msg
+                return
+
+        self._msg_queue._unsubscribe(self)
+        self._close(SubscriptionOverflowError(f"More than {self._maxsize} {self._msg_type.__name__} messages queued"))
+
+    def _wake(self):
+        """Wake up the consumer if it's waiting, called by the receiver once per frame."""
+        with self._lock:
+            getter, self._getter = self._getter, None
+        if getter is not None:
+            _complete(getter)
+
+    def get(self) -> MaybeAwaitable[T]:
+        """Wait for the next message, raise `asyncio.QueueShutDown` once closed and empty
+        (or `SubscriptionOverflowError` if it was closed because of an overflow).
+
+        Return an awaitable when called from an event loop, otherwise block the calling thread
+        (without running an event loop, so that it can be consumed from any thread).
+        """
+        # noinspection PyUnresolvedReferences
+        if asyncio._get_running_loop() is not None:
+            return self._get_async()
+        while True:
+            msg, getter = self._poll(ConcurrentFuture)
+            if getter is None:
+                return msg
+            try:
+                getter.result()
+            finally:
+                self._clear_getter(getter)
+
+    async def _get_async(self) -> T:
+        loop = asyncio.get_running_loop()
+        while True:
+            msg, getter = self._poll(loop.create_future)
+            if getter is None:
+                return msg
+            try:
+                await getter
+            finally:
+                self._clear_getter(getter)
+
+    def _poll[F: Future[None] | ConcurrentFuture[None]](self, new_future: Callable[[], F]) -> tuple[Optional[T], Optional[F]]:
+        """Pop the next message, or register a new future to wait on if there is none."""
+        with self._lock:
+            if not self._queue:
+                if self._closed:
+                    raise self._error or asyncio.QueueShutDown()
+                self._getter = getter = new_future()
+                return None, getter
+            return self._queue.popitem(last=False)[1], None
+
+    def _clear_getter(self, getter: Future[None] | ConcurrentFuture[None]):
+        with self._lock:
+            if self._getter is getter:
+                self._getter = None
+
+    def close(self):
+        """Stop receiving messages, thread safe. The queued messages can still be read."""
+        self._msg_queue._unsubscribe(self)
+        self._close()
+
+    def _close(self, error: Optional[BaseException] = None):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._error = error
+            getter, self._getter = self._getter, None
+        if getter is not None:
+            _complete(getter)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> T:
+        try:
+            return await self._get_async()
+        except asyncio.QueueShutDown:
+            raise StopAsyncIteration from None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> T:
+        try:
+            return self.get()
+        except asyncio.QueueShutDown:
+            raise StopIteration from None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __repr__(self):
+        return f"Subscription({self._msg_type.__name__}, {len(self._queue)}/{self._maxsize}, {self._overflow.name})"
+
+
+def _complete(fut: Future[None] | ConcurrentFuture[None]):
+    """Complete a future of any event loop, or a concurrent one."""
+    if isinstance(fut, ConcurrentFuture):
+        if fut.set_running_or_notify_cancel():
+            fut.set_result(None)
+        return
+    loop = fut.get_loop()
+    # noinspection PyUnresolvedReferences
+    if loop is asyncio._get_running_loop():
+        _set_none(fut)
+        return
+    try:
+        loop.call_soon_threadsafe(_set_none, fut)
+    except RuntimeError:  # the loop has been closed, nobody is waiting anymore
+        pass
+
+
+def _set_none(fut: Future[None]):
+    if not fut.done():
+        fut.set_result(None)
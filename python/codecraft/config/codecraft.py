@@ -13,6 +13,44 @@ class CCConfig(CCConfigBase):
     config_namespace = "codecraft"
 
     log_level: Literal["NOTSET", "DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"] = "INFO"
+    # Prefix every value written to outgoing buffers with its type (see `TaggedByteBuf`),
+    # only for debugging the encoding offline, the server doesn't understand tagged streams.
+    debug_tagged_buffers: bool = False
+    # Cache the registry id maps synced from servers (in the meta folder),
+    # so that reconnecting to the same server skips the registry transfer.
+    cache_registry_id_maps: bool = True
+    # Seconds the networking thread waits after being woken up before sending queued messages,
+    # a larger window coalesces more commands into each websocket frame at the cost of latency.
+    send_flush_window: float = 0.0
+    # Upper limit of the size of coalesced outgoing websocket frames (in bytes),
+    # a single message larger than this is still sent as is.
+    max_frame_size: int = 1 << 20
+    # Event loop implementation of the networking thread and the runner of synchronous calls:
+    # "auto" (uvloop, or winloop on Windows, if installed, asyncio otherwise), "asyncio", "uvloop", "winloop",
+    # or a "module:function" reference to any event loop factory.
+    event_loop: str = "auto"
+    # Deflate level of outgoing websocket frames (0 to disable compression, -1 for zlib's default),
+    # compression is only used if the server accepts it in the websocket handshake.
+    compression_level: int = 6
+    # Outgoing websocket frames smaller than this (in bytes) are sent uncompressed,
+    # compressing small frames costs more time than it saves.
+    compression_threshold: int = 4096
+    # Limit the commands in flight (sent but without a result yet) of each client to an adaptive window,
+    # commands wait for a free slot when it's full (batches aren't limited).
+    flow_control: bool = True
+    # Upper limit of the adaptive window.
+    max_in_flight_cmds: int = 8192
+    # Size (in bytes) of the buffered commands that makes a pipeline (see `CCClient.pipeline()`) send them.
+    pipeline_flush_size: int = 1 << 16
+    # Whether commands run from synchronous code are handed to the networking thread directly,
+    # blocking the calling thread until the result arrives instead of running an event loop for every command.
+    # (Not for same-loop clients, nor while batching or pipelining)
+    loop_free_sync: bool = True
+    # Only keep a view of command result payloads in the receiver and parse them when the result is read
+    # (by the waiter of the command), so that large results don't delay the other results of a frame.
+    defer_result_parsing: bool = True
+    # Default size of the queue of a message subscription (see `CCClient.subscribe()`).
+    subscription_queue_size: int = 1024
 
 
 _ENV_FILE = meta_path(".env")
@@ -1 +1 @@
-from .coro import auto_async, set_task_name, MaybeAwaitable
+from .coro import auto_async, set_task_name, new_event_loop, MaybeAwaitable
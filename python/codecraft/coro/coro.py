@@ -1,14 +1,41 @@
 from __future__ import annotations
 
 import asyncio
+import importlib
+import sys
 from typing import TYPE_CHECKING
 
+from codecraft.config import CCConfig
+from codecraft.log import LOGGER
+
 if TYPE_CHECKING:
     from typing import Optional, Any
     from collections.abc import Awaitable, Callable, Coroutine
     from asyncio import AbstractEventLoop
 
-_RUNNER = asyncio.Runner()
+
+def _resolve_loop_factory(name: str) -> Callable[[], AbstractEventLoop]:
+    if name == "asyncio":
+        return asyncio.new_event_loop
+    if name == "auto":
+        module = "winloop" if sys.platform == "win32" else "uvloop"
+        try:
+            return importlib.import_module(module).new_event_loop
+        except ImportError:
+            return asyncio.new_event_loop
+
+    module, _, attr = name.partition(":")
+    try:
+        return getattr(importlib.import_module(module), attr or "new_event_loop")
+    except (ImportError, AttributeError) as e:
+        raise RuntimeError(f"Invalid event loop implementation \"{name}\": {e}") from e
+
+
+new_event_loop = _resolve_loop_factory(CCConfig.event_loop)
+"""Create an event loop of the implementation configured by `CCConfig.event_loop`."""
+LOGGER.debug(f"Event loop factory: {new_event_loop.__module__}.{new_event_loop.__qualname__}")
+
+_RUNNER = asyncio.Runner(loop_factory=new_event_loop)
 
 type MaybeAwaitable[T] = T | Awaitable[T]
 
@@ -17,7 +44,10 @@ def auto_async[** P, R](coro_func: Callable[P, Coroutine[Any, Any, R]]) -> Calla
     """A decorator to allow both asyncio and normal (synchronous) use of a coroutine function.
 
     When called from a running event loop, return the coroutine created by `coro_func`.
-    When called from a normal (synchronous) context, run `_RUNNER.run(coro_func())` and return the result.
+    When called from a normal (synchronous) context, run `_RUNNER.run(coro_func())` and return the result,
+    unless `coro_func` returned something other than a coroutine
+    (e.g. a `CmdHandle` while pipelining, or a result that was already available),
+    which is returned as is.
     """
     def inner(*args: P.args, **kwargs: P.kwargs) -> MaybeAwaitable[R]:
         # noinspection PyUnresolvedReferences,PyProtectedMember
@@ -25,7 +55,10 @@ def auto_async[** P, R](coro_func: Callable[P, Coroutine[Any, Any, R]]) -> Calla
         if loop is not None:
             return coro_func(*args, **kwargs)
         else:
-            return _RUNNER.run(coro_func(*args, **kwargs))
+            coro = coro_func(*args, **kwargs)
+            if not asyncio.iscoroutine(coro):
+                return coro
+            return _RUNNER.run(coro)
 
     return inner
 
@@ -1,10 +1,11 @@
 from . import cmd
 from . import msg
 
-from .byte_buf import ByteBuf
+from .byte_buf import ByteBuf, ByteBufPool
 from .valued_event import ValuedEvent
 from .metaclass import add_to_slots
 from .resource import ResLoc, ResLocLike
+from .nbt import FrozenNBT
 from .meta_folder import meta_path
 from .id_map import IdMap, RegistryIdMap
 from .registry import (
@@ -17,4 +18,4 @@ from .registry import (
 from .default_instance import LazyDefaultInstance
 # from .config_file import
 # from .observable import
-from .error import CmdError
+from .error import CmdError, BroadcastError
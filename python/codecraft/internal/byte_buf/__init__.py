@@ -1 +1,3 @@
 from .byte_buf import ByteBuf
+from .byte_buf_pool import ByteBufPool
+from .tagged import TaggedByteBuf, decode_tagged
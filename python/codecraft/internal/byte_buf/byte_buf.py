@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-from contextlib import contextmanager
 import enum
 from uuid import UUID
 from array import array
@@ -8,14 +7,23 @@ from collections.abc import Buffer, Iterable
 
 import amulet_nbt
 from amulet_nbt import ReadOffset, CompoundTag
-from itertools import repeat, count
+from itertools import count
 from struct import Struct
+from functools import lru_cache
 from typing import TYPE_CHECKING
 from spatium import Vec2i, Vec2, Vec3i, Vec3, Transform2D, Transform3D
 import crc32c
 
-from codecraft.internal.byte_buf.byte_utils import _array_adapt_byteorder
+import numpy as np
+
+from codecraft.internal.byte_buf.byte_utils import (
+    _array_adapt_byteorder,
+    _encode_varintegers,
+    _decode_varintegers,
+    _decode_varint_ascii_pairs
+)
 from codecraft.internal.resource import ResLoc
+from codecraft.internal.nbt import FrozenNBT, encode_nbt
 
 if TYPE_CHECKING:
     from amulet_nbt import AnyNBT
@@ -66,11 +74,48 @@ ST_TRANSFORM3DD = Struct(f"!12{TC_DOUBLE}")
 ST_UUID = Struct(f"!QQ")
 
 
+@lru_cache(maxsize=256)
+def _array_struct(tc: str, n: int) -> Struct:
+    """A (cached) struct of `n` consecutive values of type `tc`, for packing or unpacking a whole sequence at once."""
+    return Struct(f"!{n}{tc}")
+
+# noinspection DuplicatedCode
+DT_BYTE = np.dtype(f">{TC_BYTE}")
+DT_SHORT = np.dtype(f">{TC_SHORT}")
+DT_INT = np.dtype(f">{TC_INT}")
+DT_LONG = np.dtype(f">{TC_LONG}")
+DT_UBYTE = np.dtype(f">{TC_UBYTE}")
+DT_USHORT = np.dtype(f">{TC_USHORT}")
+DT_UINT = np.dtype(f">{TC_UINT}")
+DT_ULONG = np.dtype(f">{TC_ULONG}")
+DT_FLOAT = np.dtype(f">{TC_FLOAT}")
+DT_DOUBLE = np.dtype(f">{TC_DOUBLE}")
+
+# Var len number sequences at least this long are encoded/decoded using the vectorized (numpy) codec.
+VECTORIZE_THRESHOLD = 64
+
+# The smallest capacity a growing buffer allocates, avoids lots of tiny reallocations for small buffers.
+MIN_CAPACITY = 64
+
+
 # noinspection PyProtectedMember
 class ByteBuf:
+    """A buffer for encoding and decoding the protocol.
+
+    The views returned by a growable buffer (e.g. `written_view`, `read_blob(view=True)`)
+    are only valid until the buffer is modified, cleared or returned to its pool,
+    growing it while views are alive moves the contents to new memory (see `allocate()`).
+    """
+
     __slots__ = "_buffer", "_pos", "_size", "_client"
 
     def __init__(self, value: int | memoryview | Buffer = 0, client: CCClient = None):
+        """
+        - `int`: an empty growable buffer with the specified initial capacity
+        - `memoryview`: a fixed size buffer backed by the memoryview without copying,
+          read-only if the memoryview is read-only (e.g. a view of a received frame)
+        - other buffers: a growable buffer initialized with a copy of the data
+        """
         self._buffer: bytearray | memoryview
         if isinstance(value, int):
             self._buffer = bytearray(value)
@@ -89,7 +134,7 @@ class ByteBuf:
         self._client = client
 
     def __bytes__(self):
-        return bytes(self._buffer)
+        return bytes(self.written_view)
 
     @property
     def written_view(self) -> memoryview:
@@ -122,18 +167,24 @@ class ByteBuf:
         """Create a view of a slice in this buffer."""
         if not isinstance(item, slice):
             raise TypeError("ByteBuf only supports slicing")
-        result = ByteBuf()
-        result._buffer = memoryview(self._buffer)[item]
-        return result
+        return ByteBuf(self.written_view[item], client=self._client)
+
+    @property
+    def readonly(self) -> bool:
+        return isinstance(self._buffer, memoryview) and self._buffer.readonly
 
     def reset(self):
         self._pos = 0
 
+    @property
+    def capacity(self) -> int:
+        return len(self._buffer)
+
     def clear(self):
+        """Discard all contents of this buffer, the allocated capacity is kept for reuse."""
         if isinstance(self._buffer, bytearray):
             self._pos = 0
             self._size = 0
-            self._buffer.clear()
         else:
             raise ValueError("This buffer is not resizable")
 
@@ -141,17 +192,33 @@ class ByteBuf:
         return crc32c.crc32c(self.full_view)
 
     def allocate(self, length: int):
+        """Grow the capacity of this buffer by exactly `length` bytes.
+
+        A bytearray can't be resized while views of it are alive,
+        in which case the contents are copied to a new one and the views keep the old memory.
+        """
         if length < 0:
             raise ValueError("Can't allocate a negative amount of bytes")
         if not isinstance(self._buffer, bytearray):
             raise ValueError("This buffer is not resizable")
-        self._buffer.extend(repeat(0, length))  # TODO: smart allocate strategy? (less micro-allocations)
+        try:
+            self._buffer += bytes(length)
+        except BufferError:
+            buffer = bytearray(len(self._buffer) + length)
+            buffer[:self._size] = memoryview(self._buffer)[:self._size]
+            self._buffer = buffer
 
     # region Internal
     def _allocate_to_fit(self, size: int):
-        remaining = len(self._buffer) - self._size
-        if remaining < size:
-            self.allocate(size - remaining)
+        """Make sure that `size` more bytes can be written.
+
+        The capacity is grown geometrically (at least doubled),
+        so writing n bytes in small pieces only reallocates O(log n) times.
+        """
+        capacity = len(self._buffer)
+        required = self._size + size
+        if capacity < required:
+            self.allocate(max(required, capacity * 2, MIN_CAPACITY) - capacity)
 
     def _read_struct(self, st: Struct):
         if self.remaining < st.size:
@@ -172,23 +239,16 @@ class ByteBuf:
         self._size += st.size
         return self
 
-    def _read_struct_array_tuple(self, st: Struct):
-        n = self.read_uvarint()
-        size = st.size
-        result = tuple(st.unpack_from(self._buffer, self._pos + size * i)[0] for i in range(n))
-        self._pos += size * n
-        return result
+    def _read_struct_array_tuple(self, tc: str) -> tuple:
+        return self._read_struct(_array_struct(tc, self.read_uvarint()))
 
-    def _write_struct_sequence(self, st: Struct, seq: Sequence) -> Self:
+    def _write_struct_sequence(self, tc: str, seq: Sequence) -> Self:
         self.write_uvarint(len(seq))
-        size = st.size * len(seq)
-        self._size += size
-        self._allocate_to_fit(size)
-        for item in seq:
-            st.pack_into(self._buffer, self._size, item)
-        return self
+        return self._write_struct_raw(_array_struct(tc, len(seq)), seq)
 
     def _read_memoryview(self, size: int) -> memoryview:
+        if self.remaining < size:
+            raise ValueError("Buffer underflow")
         view = memoryview(self._buffer)[self._pos: self._pos + size]
         self._pos += size
         return view
@@ -202,8 +262,34 @@ class ByteBuf:
     def _write_raw_array(self, tc: str, arr: array) -> Self:
         if arr.typecode != tc:
             raise TypeError(f"Expected array of type '{tc}', got '{arr.typecode}'")
-        _array_adapt_byteorder(arr)
-        self._write_buffer(arr, arr.itemsize * len(arr))
+        return self._write_ndarray(np.dtype(f">{tc}"), np.frombuffer(arr, dtype=f"={tc}"))
+
+    def _read_ndarray(self, dtype: np.dtype) -> np.ndarray:
+        """Read an array as a big-endian numpy array viewing into this buffer (no copying).
+
+        Arrays read from a growable buffer are copied,
+        since the buffer may be reused while the array is still referenced.
+        """
+        n = self.read_uvarint()
+        size = dtype.itemsize * n
+        if self.remaining < size:
+            raise ValueError("Buffer underflow")
+        arr = np.frombuffer(self._buffer, dtype=dtype, count=n, offset=self._pos)
+        if isinstance(self._buffer, bytearray):
+            arr = arr.copy()
+        self._pos += size
+        return arr
+
+    def _write_ndarray(self, dtype: np.dtype, arr: np.ndarray) -> Self:
+        if arr.dtype.kind != dtype.kind or arr.dtype.itemsize != dtype.itemsize:
+            raise TypeError(f"Expected array of type '{dtype.newbyteorder("=")}', got '{arr.dtype}'")
+        if arr.ndim != 1:
+            raise ValueError(f"Expected a 1-dimensional array, got {arr.ndim} dimensions")
+        # no copy if the array is already big-endian and contiguous,
+        # otherwise a converted copy is made and the original array is left untouched
+        arr = np.ascontiguousarray(arr, dtype=dtype)
+        self.write_uvarint(len(arr))
+        self._write_buffer(memoryview(arr).cast("B"))
         return self
 
     def _read_many[T](self, reader: Callable[[], T]) -> Iterable[T]:
@@ -226,6 +312,8 @@ class ByteBuf:
             if not byte & 0b1000_0000:
                 self._pos += (i + 1)
                 break
+        if value >> bits:  # only possible with the last byte
+            raise ValueError(f"Var len number too large (>{bits} bits)")
 
         if signed:
             sign_bit = value & 0b1
@@ -262,16 +350,61 @@ class ByteBuf:
 
         return self
 
+    def _read_varinteger_ndarray(self, bits: int, max_bytes: int, signed: bool) -> np.ndarray:
+        n = self.read_uvarint()
+        data = np.frombuffer(self._buffer, dtype=np.uint8, count=self._size - self._pos, offset=self._pos)
+        values, size = _decode_varintegers(data, n, bits, max_bytes, signed)
+        self._pos += size
+        return values
+
+    def _read_varinteger_tuple(self, bits: int, max_bytes: int, signed: bool) -> tuple[int, ...]:
+        pos = self._pos
+        n = self.read_uvarint()
+        if n < VECTORIZE_THRESHOLD:
+            return tuple(self._read_varinteger(bits, max_bytes, signed) for _ in range(n))
+        self._pos = pos
+        return tuple(self._read_varinteger_ndarray(bits, max_bytes, signed).tolist())
+
+    def _write_varinteger_ndarray(
+        self,
+        values: np.ndarray,
+        bits: int, max_bytes: int, signed: bool,
+        min: int, max: int
+    ) -> Self:
+        if values.dtype.kind not in "iu":
+            raise TypeError(f"Expected an integer array, got {values.dtype}")
+        if values.ndim != 1:
+            raise ValueError(f"Expected a 1-dimensional array, got {values.ndim} dimensions")
+        if len(values) and (values.min() < min or values.max() > max):
+            raise ValueError(f"Var len number out of range: [{values.min()}, {values.max()}]")
+        self.write_uvarint(len(values))
+        self._write_buffer(memoryview(_encode_varintegers(values, bits, max_bytes, signed)))
+        return self
+
+    def _write_varinteger_sequence(
+        self,
+        values: Sequence[int],
+        bits: int, mask: int, max_bytes: int, signed: bool,
+        min: int, max: int
+    ) -> Self:
+        if len(values) < VECTORIZE_THRESHOLD:
+            self.write_uvarint(len(values))
+            for value in values:
+                self._write_varinteger(value, bits, mask, max_bytes, signed, min, max)
+            return self
+
+        try:
+            arr = np.asarray(values, dtype=np.int64 if signed else np.uint64)
+        except OverflowError as e:
+            raise ValueError(f"Var len number out of range: {e}") from e
+        return self._write_varinteger_ndarray(arr, bits, max_bytes, signed, min, max)
+
     def _write_buffer(self, data: Buffer, size: int = None):
         # noinspection PyTypeChecker
         size = len(data) if size is None else size
+        self._allocate_to_fit(size)
         self._buffer[self._size: self._size + size] = data
         self._size += size
-
-    @contextmanager
-    def __writing_type(self, tp: BufPrimitive):
-        """May be used for dynamic types in the future, currently unused."""
-        yield
     # endregion
 
     # region Simple
@@ -297,35 +430,25 @@ class ByteBuf:
         return self._read_struct(ST_ULONG)[0]
 
     def write_byte(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.BYTE):
-            return self._write_struct(ST_BYTE, value)
+        return self._write_struct(ST_BYTE, value)
     def write_short(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.SHORT):
-            return self._write_struct(ST_SHORT, value)
+        return self._write_struct(ST_SHORT, value)
     def write_int(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.INT):
-            return self._write_struct(ST_INT, value)
+        return self._write_struct(ST_INT, value)
     def write_long(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.LONG):
-            return self._write_struct(ST_LONG, value)
+        return self._write_struct(ST_LONG, value)
     def write_float(self, value: float) -> Self:
-        with self.__writing_type(BufPrimitive.FLOAT):
-            return self._write_struct(ST_FLOAT, value)
+        return self._write_struct(ST_FLOAT, value)
     def write_double(self, value: float) -> Self:
-        with self.__writing_type(BufPrimitive.DOUBLE):
-            return self._write_struct(ST_DOUBLE, value)
+        return self._write_struct(ST_DOUBLE, value)
     def write_ubyte(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.UBYTE):
-            return self._write_struct(ST_UBYTE, value)
+        return self._write_struct(ST_UBYTE, value)
     def write_ushort(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.USHORT):
-            return self._write_struct(ST_USHORT, value)
+        return self._write_struct(ST_USHORT, value)
     def write_uint(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.UINT):
-            return self._write_struct(ST_UINT, value)
+        return self._write_struct(ST_UINT, value)
     def write_ulong(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.ULONG):
-            return self._write_struct(ST_ULONG, value)
+        return self._write_struct(ST_ULONG, value)
 
     def read_varint(self) -> int:
         return self._read_varinteger(32, 5, True)
@@ -337,91 +460,97 @@ class ByteBuf:
         return self._read_varinteger(64, 10, False)
 
     def write_varint(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.VARINT):
-            return self._write_varinteger(value, 32, 0xFFFF_FFFF, 5, True, -2 ** 31, 2 ** 31 - 1)
+        return self._write_varinteger(value, 32, 0xFFFF_FFFF, 5, True, -2 ** 31, 2 ** 31 - 1)
     def write_uvarint(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.UVARINT):
-            return self._write_varinteger(value, 32, 0xFFFF_FFFF, 5, False, 0, 2 ** 32 - 1)
+        return self._write_varinteger(value, 32, 0xFFFF_FFFF, 5, False, 0, 2 ** 32 - 1)
     def write_varlong(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.VARLONG):
-            return self._write_varinteger(value, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, True, -2 ** 63, 2 ** 63 - 1)
+        return self._write_varinteger(value, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, True, -2 ** 63, 2 ** 63 - 1)
     def write_uvarlong(self, value: int) -> Self:
-        with self.__writing_type(BufPrimitive.UVARLONG):
-            return self._write_varinteger(value, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, False, 0, 2 ** 64 - 1)
+        return self._write_varinteger(value, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, False, 0, 2 ** 64 - 1)
 
     def read_varint_tuple(self) -> tuple[int, ...]:
-        return tuple(self._read_many(self.read_varint))
+        return self._read_varinteger_tuple(32, 5, True)
     def read_uvarint_tuple(self) -> tuple[int, ...]:
-        return tuple(self._read_many(self.read_uvarint))
+        return self._read_varinteger_tuple(32, 5, False)
     def read_varlong_tuple(self) -> tuple[int, ...]:
-        return tuple(self._read_many(self.read_varlong))
+        return self._read_varinteger_tuple(64, 10, True)
     def read_uvarlong_tuple(self) -> tuple[int, ...]:
-        return tuple(self._read_many(self.read_uvarlong))
+        return self._read_varinteger_tuple(64, 10, False)
 
     def write_varint_sequence(self, values: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.VARINT_ARRAY):
-            return self._write_many(values, self.write_varint)
+        return self._write_varinteger_sequence(values, 32, 0xFFFF_FFFF, 5, True, -2 ** 31, 2 ** 31 - 1)
     def write_uvarint_sequence(self, values: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UVARINT_ARRAY):
-            return self._write_many(values, self.write_uvarint)
+        return self._write_varinteger_sequence(values, 32, 0xFFFF_FFFF, 5, False, 0, 2 ** 32 - 1)
     def write_varlong_sequence(self, values: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.VARLONG_ARRAY):
-            return self._write_many(values, self.write_varlong)
+        return self._write_varinteger_sequence(
+            values, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, True, -2 ** 63, 2 ** 63 - 1)
     def write_uvarlong_sequence(self, values: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UVARLONG_ARRAY):
-            return self._write_many(values, self.write_uvarlong)
+        return self._write_varinteger_sequence(
+            values, 64, 0xFFFF_FFFF_FFFF_FFFF, 10, False, 0, 2 ** 64 - 1)
+
+    def read_varint_ndarray(self) -> np.ndarray:
+        """Read a var int array as an `int32` numpy array."""
+        return self._read_varinteger_ndarray(32, 5, True)
+    def read_uvarint_ndarray(self) -> np.ndarray:
+        """Read an unsigned var int array as an `uint32` numpy array."""
+        return self._read_varinteger_ndarray(32, 5, False)
+    def read_varlong_ndarray(self) -> np.ndarray:
+        """Read a var long array as an `int64` numpy array."""
+        return self._read_varinteger_ndarray(64, 10, True)
+    def read_uvarlong_ndarray(self) -> np.ndarray:
+        """Read an unsigned var long array as an `uint64` numpy array."""
+        return self._read_varinteger_ndarray(64, 10, False)
+
+    def write_varint_ndarray(self, values: np.ndarray) -> Self:
+        return self._write_varinteger_ndarray(values, 32, 5, True, -2 ** 31, 2 ** 31 - 1)
+    def write_uvarint_ndarray(self, values: np.ndarray) -> Self:
+        return self._write_varinteger_ndarray(values, 32, 5, False, 0, 2 ** 32 - 1)
+    def write_varlong_ndarray(self, values: np.ndarray) -> Self:
+        return self._write_varinteger_ndarray(values, 64, 10, True, -2 ** 63, 2 ** 63 - 1)
+    def write_uvarlong_ndarray(self, values: np.ndarray) -> Self:
+        return self._write_varinteger_ndarray(values, 64, 10, False, 0, 2 ** 64 - 1)
 
     def read_byte_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_BYTE)
+        return self._read_struct_array_tuple(TC_BYTE)
     def read_short_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_SHORT)
+        return self._read_struct_array_tuple(TC_SHORT)
     def read_int_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_INT)
+        return self._read_struct_array_tuple(TC_INT)
     def read_long_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_LONG)
+        return self._read_struct_array_tuple(TC_LONG)
     def read_float_tuple(self) -> tuple[float, ...]:
-        return self._read_struct_array_tuple(ST_FLOAT)
+        return self._read_struct_array_tuple(TC_FLOAT)
     def read_double_tuple(self) -> tuple[float, ...]:
-        return self._read_struct_array_tuple(ST_DOUBLE)
+        return self._read_struct_array_tuple(TC_DOUBLE)
     def read_ubyte_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_UBYTE)
+        return self._read_struct_array_tuple(TC_UBYTE)
     def read_ushort_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_USHORT)
+        return self._read_struct_array_tuple(TC_USHORT)
     def read_uint_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_UINT)
+        return self._read_struct_array_tuple(TC_UINT)
     def read_ulong_tuple(self) -> tuple[int, ...]:
-        return self._read_struct_array_tuple(ST_ULONG)
+        return self._read_struct_array_tuple(TC_ULONG)
 
     def write_byte_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.BYTE_ARRAY):
-            return self._write_struct_sequence(ST_BYTE, sequence)
+        return self._write_struct_sequence(TC_BYTE, sequence)
     def write_short_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.SHORT_ARRAY):
-            return self._write_struct_sequence(ST_SHORT, sequence)
+        return self._write_struct_sequence(TC_SHORT, sequence)
     def write_int_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.INT_ARRAY):
-            return self._write_struct_sequence(ST_INT, sequence)
+        return self._write_struct_sequence(TC_INT, sequence)
     def write_long_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.LONG_ARRAY):
-            return self._write_struct_sequence(ST_LONG, sequence)
+        return self._write_struct_sequence(TC_LONG, sequence)
     def write_float_sequence(self, sequence: Sequence[float]) -> Self:
-        with self.__writing_type(BufPrimitive.FLOAT_ARRAY):
-            return self._write_struct_sequence(ST_FLOAT, sequence)
+        return self._write_struct_sequence(TC_FLOAT, sequence)
     def write_double_sequence(self, sequence: Sequence[float]) -> Self:
-        with self.__writing_type(BufPrimitive.DOUBLE_ARRAY):
-            return self._write_struct_sequence(ST_DOUBLE, sequence)
+        return self._write_struct_sequence(TC_DOUBLE, sequence)
     def write_ubyte_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UBYTE_ARRAY):
-            return self._write_struct_sequence(ST_UBYTE, sequence)
+        return self._write_struct_sequence(TC_UBYTE, sequence)
     def write_ushort_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.USHORT_ARRAY):
-            return self._write_struct_sequence(ST_USHORT, sequence)
+        return self._write_struct_sequence(TC_USHORT, sequence)
     def write_uint_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UINT_ARRAY):
-            return self._write_struct_sequence(ST_UINT, sequence)
+        return self._write_struct_sequence(TC_UINT, sequence)
     def write_ulong_sequence(self, sequence: Sequence[int]) -> Self:
-        with self.__writing_type(BufPrimitive.ULONG_ARRAY):
-            return self._write_struct_sequence(ST_ULONG, sequence)
+        return self._write_struct_sequence(TC_ULONG, sequence)
 
     def read_byte_array(self) -> array[int]:
         return self._read_raw_array(TC_BYTE)
@@ -445,35 +574,67 @@ class ByteBuf:
         return self._read_raw_array(TC_ULONG)
 
     def write_byte_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.BYTE_ARRAY):
-            return self._write_raw_array(TC_BYTE, arr)
+        return self._write_raw_array(TC_BYTE, arr)
     def write_short_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.SHORT_ARRAY):
-            return self._write_raw_array(TC_SHORT, arr)
+        return self._write_raw_array(TC_SHORT, arr)
     def write_int_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.INT_ARRAY):
-            return self._write_raw_array(TC_INT, arr)
+        return self._write_raw_array(TC_INT, arr)
     def write_long_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.LONG_ARRAY):
-            return self._write_raw_array(TC_LONG, arr)
+        return self._write_raw_array(TC_LONG, arr)
     def write_float_array(self, arr: array[float]) -> Self:
-        with self.__writing_type(BufPrimitive.FLOAT_ARRAY):
-            return self._write_raw_array(TC_FLOAT, arr)
+        return self._write_raw_array(TC_FLOAT, arr)
     def write_double_array(self, arr: array[float]) -> Self:
-        with self.__writing_type(BufPrimitive.DOUBLE_ARRAY):
-            return self._write_raw_array(TC_DOUBLE, arr)
+        return self._write_raw_array(TC_DOUBLE, arr)
     def write_ubyte_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UBYTE_ARRAY):
-            return self._write_raw_array(TC_UBYTE, arr)
+        return self._write_raw_array(TC_UBYTE, arr)
     def write_ushort_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.USHORT_ARRAY):
-            return self._write_raw_array(TC_USHORT, arr)
+        return self._write_raw_array(TC_USHORT, arr)
     def write_uint_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.UINT_ARRAY):
-            return self._write_raw_array(TC_UINT, arr)
+        return self._write_raw_array(TC_UINT, arr)
     def write_ulong_array(self, arr: array[int]) -> Self:
-        with self.__writing_type(BufPrimitive.ULONG_ARRAY):
-            return self._write_raw_array(TC_ULONG, arr)
+        return self._write_raw_array(TC_ULONG, arr)
+
+    def read_byte_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_BYTE)
+    def read_short_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_SHORT)
+    def read_int_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_INT)
+    def read_long_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_LONG)
+    def read_float_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_FLOAT)
+    def read_double_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_DOUBLE)
+    def read_ubyte_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_UBYTE)
+    def read_ushort_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_USHORT)
+    def read_uint_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_UINT)
+    def read_ulong_ndarray(self) -> np.ndarray:
+        return self._read_ndarray(DT_ULONG)
+
+    def write_byte_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_BYTE, arr)
+    def write_short_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_SHORT, arr)
+    def write_int_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_INT, arr)
+    def write_long_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_LONG, arr)
+    def write_float_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_FLOAT, arr)
+    def write_double_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_DOUBLE, arr)
+    def write_ubyte_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_UBYTE, arr)
+    def write_ushort_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_USHORT, arr)
+    def write_uint_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_UINT, arr)
+    def write_ulong_ndarray(self, arr: np.ndarray) -> Self:
+        return self._write_ndarray(DT_ULONG, arr)
 
     def read_vec2i(self) -> Vec2i:
         return Vec2i(*self._read_struct(ST_VEC2I))
@@ -497,35 +658,25 @@ class ByteBuf:
         return Transform3D(*self._read_struct(ST_TRANSFORM3DD))
 
     def write_vec2i(self, value: Vec2i) -> Self:
-        with self.__writing_type(BufPrimitive.VEC2I):
-            return self._write_struct_raw(ST_VEC2I, value)
+        return self._write_struct_raw(ST_VEC2I, value)
     def write_vec2f(self, value: Vec2) -> Self:
-        with self.__writing_type(BufPrimitive.VEC2F):
-            return self._write_struct_raw(ST_VEC2F, value)
+        return self._write_struct_raw(ST_VEC2F, value)
     def write_vec2d(self, value: Vec2) -> Self:
-        with self.__writing_type(BufPrimitive.VEC2D):
-            return self._write_struct_raw(ST_VEC2D, value)
+        return self._write_struct_raw(ST_VEC2D, value)
     def write_vec3i(self, value: Vec3i) -> Self:
-        with self.__writing_type(BufPrimitive.VEC3I):
-            return self._write_struct_raw(ST_VEC3I, value)
+        return self._write_struct_raw(ST_VEC3I, value)
     def write_vec3f(self, value: Vec3) -> Self:
-        with self.__writing_type(BufPrimitive.VEC3F):
-            return self._write_struct_raw(ST_VEC3F, value)
+        return self._write_struct_raw(ST_VEC3F, value)
     def write_vec3d(self, value: Vec3) -> Self:
-        with self.__writing_type(BufPrimitive.VEC3D):
-            return self._write_struct_raw(ST_VEC3D, value)
+        return self._write_struct_raw(ST_VEC3D, value)
     def write_transform2df(self, value: Transform2D) -> Self:
-        with self.__writing_type(BufPrimitive.TRANSFORM2DF):
-            return self._write_struct_raw(ST_TRANSFORM2DF, value)
+        return self._write_struct_raw(ST_TRANSFORM2DF, value)
     def write_transform2dd(self, value: Transform2D) -> Self:
-        with self.__writing_type(BufPrimitive.TRANSFORM2DD):
-            return self._write_struct_raw(ST_TRANSFORM2DD, value)
+        return self._write_struct_raw(ST_TRANSFORM2DD, value)
     def write_transform3df(self, value: Transform3D) -> Self:
-        with self.__writing_type(BufPrimitive.TRANSFORM3DF):
-            return self._write_struct_raw(ST_TRANSFORM3DF, value)
+        return self._write_struct_raw(ST_TRANSFORM3DF, value)
     def write_transform3dd(self, value: Transform3D) -> Self:
-        with self.__writing_type(BufPrimitive.TRANSFORM3DD):
-            return self._write_struct_raw(ST_TRANSFORM3DD, value)
+        return self._write_struct_raw(ST_TRANSFORM3DD, value)
     # endregion
 
     def read_bool(self) -> bool:
@@ -536,58 +687,67 @@ class ByteBuf:
         return bool(byte)
 
     def write_bool(self, value: bool) -> Self:
-        with self.__writing_type(BufPrimitive.BOOLEAN):
-            self._allocate_to_fit(1)
-            self._buffer[self._size] = 1 if value else 0
-            self._size += 1
+        self._allocate_to_fit(1)
+        self._buffer[self._size] = 1 if value else 0
+        self._size += 1
         return self
 
     def read_bool_tuple(self) -> tuple[bool, ...]:
         return tuple(self._read_many(self.read_bool))
     def write_bool_sequence(self, values: Sequence[bool]) -> Self:
-        with self.__writing_type(BufPrimitive.BOOLEAN_ARRAY):
-            self._allocate_to_fit(len(values))
-            return self._write_many(values, self.write_bool)
+        self._allocate_to_fit(len(values))
+        return self._write_many(values, self.write_bool)
 
-    def read_blob(self) -> bytes:
-        return self._read_memoryview(self.read_uvarint()).tobytes()
+    def read_blob(self, view: bool = False) -> bytes | memoryview:
+        """Read a blob, if `view` is True, return a memoryview into this buffer instead of a copy."""
+        data = self._read_memoryview(self.read_uvarint())
+        return data if view else data.tobytes()
 
     def write_blob(self, blob: bytes | bytearray | memoryview) -> Self:
-        with self.__writing_type(BufPrimitive.BLOB):
-            if isinstance(blob, bytes | bytearray):
-                self._write_buffer(blob)
-            elif isinstance(blob, memoryview):
-                self._write_buffer(blob, blob.nbytes)
-            else:
-                raise TypeError(blob)
+        if isinstance(blob, bytes | bytearray):
+            self.write_uvarint(len(blob))
+            self._write_buffer(blob)
+        elif isinstance(blob, memoryview):
+            self.write_uvarint(blob.nbytes)
+            self._write_buffer(blob, blob.nbytes)
+        else:
+            raise TypeError(blob)
         return self
 
     def read_str(self) -> str:
         return str(self._read_memoryview(self.read_uvarint()), encoding="utf8")
 
     def write_str(self, value: str) -> Self:
-        with self.__writing_type(BufPrimitive.STRING):
-            data = value.encode("utf8")
-            self.write_uvarint(len(data))
-            self._write_buffer(data)
+        data = value.encode("utf8")
+        self.write_uvarint(len(data))
+        self._write_buffer(data)
         return self
 
     def read_ascii(self) -> str:
         return str(self._read_memoryview(self.read_uvarint()), encoding="ascii")
 
+    def read_varint_ascii_pairs(self) -> list[tuple[int, str]]:
+        """Read an array of (varint, ascii) pairs (e.g. registry id map entries) in bulk,
+        much faster than reading them one by one.
+
+        The rest of the buffer is copied for parsing, so this is meant for buffers that mostly contain the array.
+        """
+        n = self.read_uvarint()
+        pairs, consumed = _decode_varint_ascii_pairs(self.to_read_view.tobytes(), n)
+        self._pos += consumed
+        return pairs
+
     def write_ascii(self, value: str) -> Self:
-        with self.__writing_type(BufPrimitive.STRING):
-            data = value.encode("ascii")
-            self.write_uvarint(len(data))
-            self._write_buffer(data)
+        data = value.encode("ascii")
+        self.write_uvarint(len(data))
+        self._write_buffer(data)
         return self
 
     def read_resloc(self) -> ResLoc:
         return ResLoc(self.read_ascii())
 
     def write_resloc(self, value: ResLoc) -> Self:
-        with self.__writing_type(BufPrimitive.RESOURCE_LOCATION):
-            self.write_ascii(str(value))
+        self.write_ascii(str(value))
         return self
 
     def read_uuid(self) -> UUID:
@@ -595,8 +755,7 @@ class ByteBuf:
         return UUID(int=msb << 64 | lsb)
 
     def write_uuid(self, value: UUID) -> Self:
-        with self.__writing_type(BufPrimitive.UUID):
-            self._write_struct(ST_UUID, value.int >> 64, value.int & 0xFFFFFFFF_FFFFFFFF)
+        self._write_struct(ST_UUID, value.int >> 64, value.int & 0xFFFFFFFF_FFFFFFFF)
         return self
 
     def read_nbt(self) -> AnyNBT:
@@ -605,7 +764,7 @@ class ByteBuf:
         # noinspection PyArgumentList
         ctx = ReadOffset(self._pos)
         result = amulet_nbt.read_nbt(
-            self._buffer,
+            self.written_view,
             compressed=False,
             little_endian=False,
             string_encoding=amulet_nbt.utf8_encoding,
@@ -621,45 +780,33 @@ class ByteBuf:
             raise ValueError(f"Expected a compound tag, got {tag}")
         return tag
 
-    def write_nbt(self, value: AnyNBT) -> Self:
-        with self.__writing_type(BufPrimitive.NBT):
-            self._write_buffer(
-                value.to_nbt(
-                    name=None,
-                    compressed=False,
-                    little_endian=False,
-                    string_encoding=amulet_nbt.utf8_encoding
-                )
-            )
+    def write_nbt(self, value: AnyNBT | FrozenNBT) -> Self:
+        if isinstance(value, FrozenNBT):
+            self._write_buffer(value.data)
+        else:
+            self._write_buffer(encode_nbt(value))
         return self
 
     def read_blockstate(self) -> Block:
-        block: Block = self.read_using_id_map(self._client.reg_id_maps.block)
-        for _ in range(self.read_varint()):
-            name = self.read_str()
-            prop = block._properties[name]
-            block[name] = prop.deserialize(self.read_str())
+        id_maps = self._client.reg_id_maps
+        block_id, values = id_maps.block_state.get_state(self.read_varint())
+        block: Block = id_maps.block[block_id]
+        for name, value in values.items():
+            prop = block._properties.get(name)
+            if prop is not None:
+                block[name] = prop.deserialize(value)
         return block
 
     def write_blockstate(self, block: Block, all=False) -> Self:
-        with self.__writing_type(BufPrimitive.BLOCK_STATE):
-            self.write_using_id_map(self._client.reg_id_maps.block, block)
-
-            props = block._all_properties() if all else block._assigned_properties()
-            num = block._num_properties() if all else len(block._assigned_properties())
-
-            self.write_varint(num)
-            for prop_name in props:
-                self.write_str(prop_name)
-                self.write_str(block._get_property(prop_name).serialize(block[prop_name]))
+        """Write the global state id of `block`, unassigned properties are the server's defaults unless `all` is true."""
+        self.write_varint(self._client.reg_id_maps.block_state.get_id(block, all))
         return self
 
     def read_fluidstate(self) -> ...:
         raise NotImplemented
 
     def write_fluidstate(self, value) -> Self:
-        with self.__writing_type(BufPrimitive.FLUID_STATE):
-            raise NotImplemented
+        raise NotImplemented
         return self
 
     def read_using_id_map[T](self, id_map: IdMap[T]) -> T:
@@ -731,3 +878,25 @@ class BufPrimitive(enum.Enum):
 
     BLOCK_STATE = 46, ByteBuf.read_blockstate, ByteBuf.write_blockstate
     FLUID_STATE = 47, ByteBuf.read_fluidstate, ByteBuf.write_fluidstate
+
+    @property
+    def id(self) -> int:
+        return self.value[0]
+
+    @property
+    def reader(self) -> Callable[[ByteBuf], Any]:
+        return self.value[1]
+
+    @property
+    def writer(self) -> Callable[..., ByteBuf]:
+        return self.value[2]
+
+    @classmethod
+    def from_id(cls, id: int) -> BufPrimitive:
+        try:
+            return _PRIMITIVES_BY_ID[id]
+        except KeyError:
+            raise ValueError(f"Invalid buffer primitive id: {id}") from None
+
+
+_PRIMITIVES_BY_ID = {p.id: p for p in BufPrimitive}
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from codecraft.internal.byte_buf.byte_buf import ByteBuf
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from codecraft.client import CCClient
+
+__all__ = ("ByteBufPool",)
+
+
+class ByteBufPool:
+    """A thread-safe pool of reusable (growable) `ByteBuf`s.
+
+    Buffers keep their capacity when they are returned to the pool,
+    so once the pool has warmed up, encoding doesn't need to allocate any new buffers.
+    """
+
+    __slots__ = "_client", "_buf_type", "_free", "_lock", "_max_pooled", "_max_capacity"
+
+    def __init__(
+        self,
+        client: CCClient = None,
+        *,
+        buf_type: type[ByteBuf] = ByteBuf,
+        max_pooled: int = 64,
+        max_capacity: int = 1 << 24
+    ):
+        """
+        :param client: the client assigned to the buffers acquired from this pool
+        :param buf_type: the type of the buffers created by this pool
+        :param max_pooled: the maximum amount of idle buffers kept by this pool
+        :param max_capacity: buffers larger than this are discarded instead of being kept by the pool
+        """
+        self._client = client
+        self._buf_type = buf_type
+        self._free: list[ByteBuf] = []
+        self._lock = threading.Lock()
+        self._max_pooled = max_pooled
+        self._max_capacity = max_capacity
+
+    def acquire(self) -> ByteBuf:
+        """Take an empty buffer from the pool, or create a new one if there are no idle buffers."""
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+        return self._buf_type(client=self._client)
+
+    def release(self, buf: ByteBuf):
+        """Return a buffer to the pool, the buffer must not be used by the caller afterward."""
+        if buf.capacity > self._max_capacity:
+            return
+        buf.clear()
+        with self._lock:
+            if len(self._free) < self._max_pooled:
+                self._free.append(buf)
+
+    @contextmanager
+    def borrow(self) -> Iterator[ByteBuf]:
+        """Acquire a buffer and release it when the block exits normally.
+
+        If the block raises, the buffer is discarded instead,
+        since it might still be referenced by an unfinished operation (e.g. a cancelled send).
+        """
+        buf = self.acquire()
+        yield buf
+        self.release(buf)
+
+    def __len__(self):
+        return len(self._free)
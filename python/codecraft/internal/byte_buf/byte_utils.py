@@ -5,9 +5,136 @@ import sys
 
 from array import array
 
+import numpy as np
+
 _IS_LE = sys.byteorder == "little"
 
 
 def _array_adapt_byteorder(arr: array[Any]):
-    if not _IS_LE:
+    """Convert between big-endian (network byte order) and native byte order in place."""
+    if _IS_LE:
         arr.byteswap()
+
+
+_UINT_TYPES = {32: np.uint32, 64: np.uint64}
+_INT_TYPES = {32: np.int32, 64: np.int64}
+
+
+def _encode_varintegers(values: np.ndarray, bits: int, max_bytes: int, signed: bool) -> np.ndarray:
+    """Vectorized version of `ByteBuf._write_varinteger()`, returns the encoded bytes of all the values.
+
+    The values must already be range checked.
+    """
+    # wraps negative values just like `value &= mask` does
+    v = values.astype(_UINT_TYPES[bits], copy=False)
+    if signed:
+        v = (v << 1) | (v >> (bits - 1))
+    if len(v) == 0:
+        return np.empty(0, dtype=np.uint8)
+
+    top = int(v.max())
+    lengths = np.ones(len(v), dtype=np.intp)
+    for i in range(1, max_bytes):
+        if top < (1 << (7 * i)):
+            break
+        lengths += v >= (1 << (7 * i))
+    max_len = int(lengths.max())
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Every group is scattered for all the values, starting from the highest group.
+    # Bytes written past the end of a shorter value always land on a lower group of a later value,
+    # which is overwritten afterward, so no masking is needed.
+    out = np.empty(int(ends[-1]) + max_len, dtype=np.uint8)
+    for i in reversed(range(max_len)):
+        group = (v >> (7 * i)).astype(np.uint8) & 0b0111_1111
+        group |= (lengths > i + 1).view(np.uint8) << 7
+        out[starts + i] = group
+    return out[:ends[-1]]
+
+
+def _decode_varintegers(data: np.ndarray, n: int, bits: int, max_bytes: int, signed: bool) -> tuple[np.ndarray, int]:
+    """Vectorized version of `ByteBuf._read_varinteger()`,
+    decode `n` values from the start of `data` (an uint8 array),
+    returns the values and the amount of bytes consumed.
+    """
+    utype = _UINT_TYPES[bits]
+    if n == 0:
+        return np.empty(0, dtype=_INT_TYPES[bits] if signed else utype), 0
+
+    ends = np.flatnonzero(data[:n * max_bytes] < 0b1000_0000)[:n]
+    if len(ends) < n:
+        if len(data) < n * max_bytes:
+            raise ValueError("Buffer underflow")
+        raise ValueError(f"Var len number too long (>{max_bytes} bytes)")
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+    max_len = int(lengths.max())
+    if max_len > max_bytes:
+        raise ValueError(f"Var len number too long (>{max_bytes} bytes)")
+    if max_len == max_bytes:
+        # the last byte of a full length value only has room for the remaining bits, like `ByteBuf._read_varinteger()`
+        if np.any(data[ends[lengths == max_bytes]] >> (bits - 7 * (max_bytes - 1))):
+            raise ValueError(f"Var len number too large (>{bits} bits)")
+
+    last = int(ends[-1])
+    v = (data[starts] & 0b0111_1111).astype(utype)
+    for i in range(1, max_len):
+        group = (data[np.minimum(starts + i, last)] & 0b0111_1111).astype(utype)
+        group *= lengths > i
+        v |= group << (7 * i)
+
+    if signed:
+        v = ((v >> 1) | (v << (bits - 1))).view(_INT_TYPES[bits])
+    return v, last + 1
+
+
+def _decode_uvarint_at(data: bytes, pos: int, max_bytes: int) -> tuple[int, int]:
+    """Decode an unsigned var int (32 bits) at `pos`, returns the value and the position after it."""
+    value = 0
+    for i in range(max_bytes):
+        b = data[pos + i]
+        value |= (b & 0b0111_1111) << (7 * i)
+        if b < 0b1000_0000:
+            if value >> 32:
+                raise ValueError("Var len number too large (>32 bits)")
+            return value, pos + i + 1
+    raise ValueError(f"Var len number too long (>{max_bytes} bytes)")
+
+
+def _decode_varint_ascii_pairs(data: bytes, n: int) -> tuple[list[tuple[int, str]], int]:
+    """Bulk version of reading `n` times `(ByteBuf.read_varint(), ByteBuf.read_ascii())` from the start of `data`,
+    returns the pairs and the amount of bytes consumed.
+
+    Single byte lengths and ids are decoded inline, which is the common case for registry entries.
+    """
+    pairs = []
+    append = pairs.append
+    pos = 0
+    try:
+        for _ in range(n):
+            raw = data[pos]
+            if raw < 0b1000_0000:
+                pos += 1
+            else:
+                raw, pos = _decode_uvarint_at(data, pos, 5)
+            # see `ByteBuf._read_varinteger()`
+            value = raw >> 1
+            if raw & 1:
+                value -= 1 << 31
+
+            length = data[pos]
+            if length < 0b1000_0000:
+                pos += 1
+            else:
+                length, pos = _decode_uvarint_at(data, pos, 5)
+            end = pos + length
+            if end > len(data):
+                raise IndexError
+            append((value, data[pos:end].decode("ascii")))
+            pos = end
+    except IndexError:
+        raise ValueError("Buffer underflow") from None
+    return pairs, pos
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from functools import wraps
+from typing import TYPE_CHECKING
+
+from codecraft.internal.byte_buf.byte_buf import ByteBuf, BufPrimitive
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+    from typing import Any
+
+__all__ = ("TaggedByteBuf", "decode_tagged")
+
+
+class TaggedByteBuf(ByteBuf):
+    """A `ByteBuf` that prefixes every value written with the id of its `BufPrimitive` (as an ubyte),
+    making the stream self-describing, so that it can be decoded without knowing its layout (see `decode_tagged()`).
+
+    Only top-level values are tagged, values written as part of another value (e.g. the length of a string) aren't.
+
+    This is only intended for debugging, the server doesn't accept tagged streams.
+    """
+
+    __slots__ = ("_tag_depth",)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tag_depth = 0
+
+
+def _tagging(primitive: BufPrimitive, write: Callable[..., ByteBuf]) -> Callable[..., ByteBuf]:
+    @wraps(write)
+    def inner(self: TaggedByteBuf, *args, **kwargs):
+        if self._tag_depth == 0:
+            ByteBuf.write_ubyte(self, primitive.id)
+        self._tag_depth += 1
+        try:
+            return write(self, *args, **kwargs)
+        finally:
+            self._tag_depth -= 1
+
+    return inner
+
+
+# writers that aren't the canonical writer of a primitive, but produce the same data
+_ALIASES = {
+    "write_ascii": BufPrimitive.STRING,
+    **{f"write_{tp}_ndarray": BufPrimitive[f"{tp.upper()}_ARRAY"] for tp in (
+        "byte", "short", "int", "long", "float", "double", "ubyte", "ushort", "uint", "ulong",
+        "varint", "uvarint", "varlong", "uvarlong"
+    )},
+    **{f"write_{tp}_sequence": BufPrimitive[f"{tp.upper()}_ARRAY"] for tp in (
+        "byte", "short", "int", "long", "float", "double", "ubyte", "ushort", "uint", "ulong"
+    )}
+}
+
+for _primitive in BufPrimitive:
+    setattr(TaggedByteBuf, _primitive.writer.__name__, _tagging(_primitive, _primitive.writer))
+for _name, _primitive in _ALIASES.items():
+    setattr(TaggedByteBuf, _name, _tagging(_primitive, getattr(ByteBuf, _name)))
+
+
+def decode_tagged(buf: ByteBuf) -> list[tuple[BufPrimitive, Any]]:
+    """Decode all the remaining values of a stream written by a `TaggedByteBuf`.
+
+    Raises `ValueError` with the position of the first value that couldn't be decoded.
+    """
+    result: list[tuple[BufPrimitive, Any]] = []
+
+    def context():
+        return ", ".join(f"{p.name}={v!r}" for p, v in result[-3:])
+
+    while buf.remaining:
+        pos = buf.pos
+        try:
+            primitive = BufPrimitive.from_id(buf.read_ubyte())
+        except ValueError as e:
+            raise ValueError(f"Invalid tag at {pos} (after {context()}): {e}") from e
+        try:
+            value = primitive.reader(buf)
+        except Exception as e:
+            raise ValueError(f"Failed to read {primitive.name} at {pos} (after {context()}): {e}") from e
+        result.append((primitive, value))
+    return result
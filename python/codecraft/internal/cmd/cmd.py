@@ -7,6 +7,7 @@ from codecraft.internal.resource import ResLoc
 from codecraft.internal.registry import Registered, TypeRegistry
 
 if TYPE_CHECKING:
+    from collections.abc import Hashable
     from typing import Optional, Any
 
     from codecraft.client import CCClient
@@ -25,6 +26,15 @@ class Cmd(ABC, Registered["Cmd", TypeRegistry], registry_name=ResLoc.codecraft("
         self._uid = client._next_cmd_uid()
         buf.write_uvarint(self._uid)
 
+    # noinspection PyMethodMayBeStatic
+    def _shard_key(self) -> Optional[Hashable]:
+        """The key to pick the connection of a multi-connection client by.
+
+        Commands of the same key are sent through the same connection, so they are executed in order.
+        Commands without a key (None) all go through the primary connection.
+        """
+        return None
+
     # noinspection PyMethodMayBeStatic
     def _parse_result(self, buf: CCByteBuf, client: CCClient) -> Any:
         """Parse the result of the command.
@@ -10,6 +10,8 @@ from codecraft.internal.resource import ResLoc
 from .cmd import Cmd
 
 if TYPE_CHECKING:
+    from collections.abc import Hashable
+
     from codecraft.client.client import CCClient
     from codecraft.block.block import Block
     from codecraft.world import World
@@ -66,5 +68,9 @@ class SetBlockCmd(AbstractWorldCmd, reg_name=ResLoc.codecraft("set_block")):
         if self._flags & SetBlockFlags.SET_NBT:
             buf.write_nbt(self._block.nbt)
 
+    def _shard_key(self) -> Hashable:
+        # the chunk, commands changing the same chunk stay ordered
+        return self._pos.x >> 4, self._pos.z >> 4
+
     def _parse_result(self, buf: ByteBuf, client: CCClient) -> bool:
         return buf.read_bool()
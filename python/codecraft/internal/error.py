@@ -5,3 +5,24 @@ class NetworkError(RuntimeError):
 
 class CmdError(RuntimeError):
     pass
+
+
+class BroadcastError(ExceptionGroup):
+    """A command run by a `BroadcastClient` failed on some of the servers.
+
+    `exceptions` are the errors of the failed servers, whose indices (in `BroadcastClient.clients`) are `indices`.
+    `results` are the results of all the servers, with the error in place of the result for the failed ones.
+    """
+
+    def __new__(cls, message: str, exceptions, indices=(), results=()):
+        self = super().__new__(cls, message, exceptions)
+        self.indices = tuple(indices)
+        self.results = list(results)
+        return self
+
+    def __init__(self, message: str, exceptions, indices=(), results=()):
+        super().__init__(message, exceptions)
+
+    def derive(self, excs):
+        # split() and subgroup() can't tell which servers the remaining errors belong to
+        return ExceptionGroup(self.message, excs)
@@ -1,16 +1,20 @@
 from __future__ import annotations
 
-from operator import itemgetter
+import math
+from bisect import bisect_right
+from operator import attrgetter, itemgetter
 from typing import overload, override, TYPE_CHECKING
 
 from codecraft.internal.resource import ResLoc
 from codecraft.internal.registry import Registry, Registered
 
 if TYPE_CHECKING:
-    from collections.abc import Mapping, Hashable, MutableMapping, Sequence
-    from typing import Self, Optional
+    from collections.abc import Mapping, Hashable, MutableMapping, Sequence, Iterable
+    from typing import Self, Optional, Any
 
+    from codecraft.block import Block
     from codecraft.internal import ResLocLike
+    from codecraft.internal.byte_buf.byte_buf import ByteBuf
     from codecraft.internal.typings import InstOrType
 
 
@@ -53,6 +57,17 @@ class IdMap[T: Hashable]:
         self._from_id[id] = obj
         self._to_id[obj] = id
 
+    def put_all(self, items: Iterable[tuple[int, T]]):
+        """Bulk version of `put()`."""
+        if self.__frozen:
+            raise ValueError("Already frozen")
+        items = list(items)
+        from_id = dict(items)
+        if len(from_id) != len(items) or not from_id.keys().isdisjoint(self._from_id):
+            raise KeyError("Duplicate ids")
+        self._from_id.update(from_id)
+        self._to_id.update((obj, id) for id, obj in items)
+
     def clear(self):
         if self.__frozen:
             raise ValueError("Frozen")
@@ -85,8 +100,6 @@ class IdMap[T: Hashable]:
 
 class RegistryIdMap[T, R](IdMap[ResLoc]):
     def __init__(self, registry: ResLocLike | Registry[T, R], *args, **kwargs):
-        super().__init__(*args, **kwargs)
-
         if isinstance(registry, Registry):
             self._name = registry.name
             self._registry = registry
@@ -94,6 +107,15 @@ class RegistryIdMap[T, R](IdMap[ResLoc]):
             self._name = ResLoc.from_like(registry)
             self._registry = None
 
+        # built when frozen: id -> registry entry (or factory of the instance), and registered type -> id
+        self._resolved: Optional[Sequence[Any] | Mapping[int, Any]] = None
+        # noinspection PyProtectedMember
+        self._instantiating = self._registry is not None and self._registry._INSTANTIATING
+        self._type_ids: dict[type, int] = {}
+
+        # last, since it may freeze
+        super().__init__(*args, **kwargs)
+
     @property
     def name(self) -> ResLoc:
         return self._name
@@ -115,15 +137,44 @@ class RegistryIdMap[T, R](IdMap[ResLoc]):
     @override
     def __getitem__(self, key) -> R | ResLoc | int:
         if isinstance(key, int):
-            name = super().__getitem__(key)
-            return self._registry[name] if self._registry is not None else name
-        elif isinstance(key, Registered) or issubclass(key, Registered):
-            return super().__getitem__(key.reg_name)
+            resolved = self._resolved
+            if resolved is None:
+                name = super().__getitem__(key)
+                return self._registry[name] if self._registry is not None else name
+            entry = resolved[key]
+            if entry is None:
+                raise KeyError(f"No entry of key {repr(self._from_id[key])}")
+            return entry() if self._instantiating else entry
+        elif isinstance(key, type):
+            id = self._type_ids.get(key)
+            if id is None:
+                if not issubclass(key, Registered):
+                    raise TypeError(key)
+                id = self._to_id[key.reg_name]
+                if self.frozen:
+                    self._type_ids[key] = id
+            return id
         elif isinstance(key, ResLoc):
-            return super().__getitem__(key)
+            return self._to_id[key]
+        elif isinstance(key, Registered):
+            return self._to_id[key.reg_name]
         else:
             raise TypeError(key)
 
+    @override
+    def freeze(self) -> Self:
+        if self.frozen:
+            return self
+        super().freeze()
+        if self._registry is not None:
+            # noinspection PyProtectedMember
+            entry = self._registry._id_table_entry
+            if isinstance(self._from_id, tuple):
+                self._resolved = tuple(map(entry, self._from_id))
+            else:
+                self._resolved = {id: entry(name) for id, name in self._from_id.items()}
+        return self
+
     def from_json_dict(self, json_dict: dict[str, int], *, freeze: bool = True):
         self.clear()
         for k, v in json_dict.items():
@@ -133,3 +184,124 @@ class RegistryIdMap[T, R](IdMap[ResLoc]):
 
     # def apply_registry[T](self, registry: Registry[T]) -> IdMap[type[T]]:
     #     return IdMap({i: registry[self[i]] for i in self if self[i] in registry}, frozen=self.frozen)
+
+
+class _StateProperty:
+    __slots__ = "stride", "values", "indices", "default_index"
+
+    def __init__(self, stride: int, values: Sequence[str], default_offset: int):
+        self.stride = stride
+        self.values = tuple(values)
+        self.indices = {v: i for i, v in enumerate(self.values)}
+        self.default_index = default_offset // stride % len(self.values) if stride else 0
+
+
+class _BlockStates:
+    __slots__ = "block_id", "base", "end", "default", "properties"
+
+    def __init__(self, block_id: int, base: int, default: int, properties: dict[str, _StateProperty]):
+        self.block_id = block_id
+        self.base = base
+        self.end = base + math.prod(len(prop.values) for prop in properties.values())
+        self.default = default
+        self.properties = properties
+
+
+# noinspection PyProtectedMember
+class BlockStateIdMap:
+    """Maps block states to the server's global block state ids.
+
+    The states of each block have consecutive ids, laid out in mixed radix order of the property value indices,
+    so only the first and default state ids,
+    and the stride and possible values of each property are synced for every block.
+    Resolved ids are memoized by block and assigned property values.
+    """
+
+    SYNC_NAME = ResLoc.codecraft("block_state")
+
+    def __init__(self, block_map: RegistryIdMap):
+        self._block_map = block_map
+        self._blocks: dict[int, _BlockStates] = {}
+        # the blocks sorted by their first state id, for looking up state ids, rebuilt when blocks are added
+        self._bases: Optional[list[int]] = None
+        self._sorted: list[_BlockStates] = []
+        self._cache: dict[tuple, int] = {}
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def put(self, block_id: int, base: int, default: int, properties: Mapping[str, tuple[int, Sequence[str]]]):
+        states = _BlockStates(
+            block_id,
+            base,
+            default,
+            {name: _StateProperty(stride, values, default - base) for name, (stride, values) in properties.items()}
+        )
+        self._blocks[block_id] = states
+        self._bases = None
+        if self._cache:
+            self._cache.clear()
+
+    def _sort(self):
+        self._sorted = sorted(self._blocks.values(), key=attrgetter("base"))
+        self._bases = [states.base for states in self._sorted]
+
+    def get_id(self, block: Block, all: bool = False) -> int:
+        """The state id of `block`, unassigned properties are the server's defaults unless `all` is true."""
+        if all and block._extra_properties:
+            # the defaults of the extra properties are part of the id, they are per instance
+            return self._resolve_id(block, all)
+        # the class decides the defaults of the other properties
+        key = (type(block), block.reg_name, all, *block._states.items())
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable property value
+            return self._resolve_id(block, all)
+        id = self._cache[key] = self._resolve_id(block, all)
+        return id
+
+    def _resolve_id(self, block: Block, all: bool) -> int:
+        states = self._blocks.get(self._block_map[block])
+        if states is None:
+            raise KeyError(f"No block states synced for {block.reg_name}")
+        id = states.default
+        for name in block._all_properties() if all else block._assigned_properties():
+            prop = states.properties.get(name)
+            if prop is None:
+                raise KeyError(f"Block {block.reg_name} has no property \"{name}\" on the server")
+            value = block._get_property(name).serialize(block[name])
+            index = prop.indices.get(value)
+            if index is None:
+                raise ValueError(f"Invalid value \"{value}\" for property \"{name}\" of {block.reg_name}")
+            id += (index - prop.default_index) * prop.stride
+        return id
+
+    def get_state(self, id: int) -> tuple[int, dict[str, str]]:
+        """The block registry id and the property values of a state id."""
+        if self._bases is None:
+            self._sort()
+        index = bisect_right(self._bases, id) - 1
+        if index < 0 or id >= self._sorted[index].end:
+            raise KeyError(f"Invalid block state id {id}")
+        states = self._sorted[index]
+        offset = id - states.base
+        values = {}
+        for name, prop in states.properties.items():
+            i = offset // prop.stride % len(prop.values) if prop.stride else 0
+            values[name] = prop.values[i]
+        return states.block_id, values
+
+    def read_sync_packet(self, buf: ByteBuf):
+        for _ in range(buf.read_uvarint()):
+            block_id = buf.read_varint()
+            base = buf.read_varint()
+            default = base + buf.read_uvarint()
+            properties = {}
+            for _ in range(buf.read_uvarint()):
+                name = buf.read_str()
+                stride = buf.read_uvarint()
+                properties[name] = stride, [buf.read_str() for _ in range(buf.read_uvarint())]
+            self.put(block_id, base, default, properties)
+        self._sort()
@@ -5,32 +5,58 @@ from typing import TYPE_CHECKING
 
 from codecraft.internal.resource import ResLoc
 from .msg import Msg
-from codecraft.internal.error import NetworkError
+from ..byte_buf.byte_buf import ByteBuf
 
 if TYPE_CHECKING:
     from typing import Optional, Any
 
     from codecraft.client import CCClient
-    from ..byte_buf.byte_buf import ByteBuf
+    from codecraft.internal.cmd import Cmd
 
 
 # noinspection PyProtectedMember
 class CmdResultMsg(Msg, reg_name=ResLoc.codecraft("cmd_result")):
+    """The result of a command, its payload is length-prefixed.
+
+    With `CCConfig.defer_result_parsing`, the receiver only keeps a view of the payload,
+    which is parsed the first time `result` is accessed (normally by the waiter of the command).
+    The payload of a command that isn't waited for anymore (e.g. timed out) is skipped.
+    """
+
     @override
     def __init__(self, buf: ByteBuf, client: CCClient):
         super().__init__(buf, client)
         self.cmd_uid = buf.read_uvarint()
         cmd = client._msg_queue._pop_running_cmd(self.cmd_uid)
-        if cmd is None:
-            raise NetworkError(f"No command with uid {self.cmd_uid}")
 
         self.type = buf.read_byte()
-        self.result: Optional[Any]
+        self._client = client
+        self._cmd: Optional[Cmd] = cmd
+        # a view of the received frame until parsed
+        self._payload: Optional[memoryview] = buf.read_blob(view=True)
+        self._result: Optional[Any] = None
 
+        if cmd is None:
+            self._payload = None
+        elif not client._defer_result_parsing:
+            self._parse()
+
+    def _parse(self):
+        payload = ByteBuf(self._payload, client=self._client)
         if self.successful:
-            self.result = cmd._parse_result(buf, client)
+            self._result = self._cmd._parse_result(payload, self._client)
         else:
-            self.result = (buf.read_str(),)
+            self._result = (payload.read_str(),)
+        # the frame can be freed once every result in it is parsed
+        self._payload = None
+        self._cmd = None
+
+    @property
+    def result(self) -> Optional[Any]:
+        """The parsed result, or the arguments of the `CmdError` if not successful."""
+        if self._payload is not None:
+            self._parse()
+        return self._result
 
     @property
     def successful(self) -> bool:
@@ -7,6 +7,9 @@ from codecraft.internal.resource import ResLoc
 from codecraft.internal.registry import TypeRegistry, Registered
 
 if TYPE_CHECKING:
+    from collections.abc import Hashable
+    from typing import Optional
+
     from codecraft.client import CCClient
     from codecraft.internal.byte_buf.byte_buf import ByteBuf
 
@@ -14,3 +17,11 @@ if TYPE_CHECKING:
 class Msg(ABC, Registered["Msg", TypeRegistry], registry_name=ResLoc.codecraft("msg")):
     @abstractmethod
     def __init__(self, buf: ByteBuf, client: CCClient): ...
+
+    # noinspection PyMethodMayBeStatic
+    def _coalesce_key(self) -> Optional[Hashable]:
+        """The key of the state this message is about, for `OverflowPolicy.COALESCE`.
+
+        A queued message is replaced by a newer one with the same key, messages without a key (None) are never coalesced.
+        """
+        return None
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import copy
+from typing import TYPE_CHECKING, final
+
+import amulet_nbt
+
+if TYPE_CHECKING:
+    from amulet_nbt import AnyNBT
+
+__all__ = ("FrozenNBT", "encode_nbt")
+
+
+def encode_nbt(tag: AnyNBT) -> bytes:
+    """Serialize an (unnamed) NBT tag in the network format."""
+    return tag.to_nbt(
+        name=None,
+        compressed=False,
+        little_endian=False,
+        string_encoding=amulet_nbt.utf8_encoding
+    )
+
+
+@final
+class FrozenNBT:
+    """An immutable snapshot of an NBT tag that is serialized only once.
+
+    Amulet-NBT tags are mutable and can't notify of changes,
+    so they have to be serialized every time they are written.
+    Use this when the same tag is written many times (e.g. placing lots of identical chests).
+    Mutating the original tag afterward doesn't affect the snapshot.
+    """
+
+    __slots__ = "_tag", "_data"
+
+    def __init__(self, tag: AnyNBT):
+        self._data = encode_nbt(tag)
+        self._tag = copy.deepcopy(tag)
+
+    @property
+    def tag(self) -> AnyNBT:
+        """A mutable copy of the frozen tag."""
+        return copy.deepcopy(self._tag)
+
+    @property
+    def data(self) -> bytes:
+        """The serialized tag."""
+        return self._data
+
+    def __repr__(self):
+        return f"FrozenNBT({self._tag.to_snbt()})"
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC
+from functools import partial
 from typing import TYPE_CHECKING, final, override, Protocol, Any
 
 from codecraft.internal.resource import ResLoc
@@ -57,6 +58,9 @@ class RegisteredProto[T: Registered, REG: Registry[Registered, Any]](Protocol):
 
 
 class Registry[T: Registered, R](ABC):
+    # whether entries are instantiated on every lookup, see `_id_table_entry()`
+    _INSTANTIATING = False
+
     def __init__(self, base_type: type[T], name: ResLocLike):
         self._base_type = base_type
         self._name = ResLoc.from_like(name)
@@ -80,6 +84,13 @@ class Registry[T: Registered, R](ABC):
     def __len__(self):
         return len(self.__map)
 
+    def _id_table_entry(self, key: ResLoc) -> Any:
+        """The value dense id tables (see `RegistryIdMap.freeze()`) store for `key`, None if there is no entry.
+
+        The value is returned as is by lookups, or called to create the instance if `_INSTANTIATING` is true.
+        """
+        return self.__map.get(key)
+
     def get[D](self, key: ResLocLike, default: D = None) -> R | D:
         key = ResLoc.from_like(key)
         result = self.__map.get(key)
@@ -109,6 +120,32 @@ class TypeRegistry[T: Registered](Registry[T, type[T]]):
 class InstantiatingRegistry[T: Registered](Registry[T, T]):
     """A registry that returns instantiated objects of entries."""
 
+    _INSTANTIATING = True
+
+    def __init__(self, base_type: type[T], name: ResLocLike):
+        super().__init__(base_type, name)
+        self._shared: dict[ResLoc, T] = {}
+
+    def get_shared[D](self, key: ResLocLike, default: D = None) -> T | D:
+        """Like `get()`, but returns a cached instance shared by all callers (a flyweight),
+        to avoid instantiating an object for every lookup.
+
+        Shared instances are frozen (with `_freeze()`) if their type supports it,
+        callers that want to modify one should copy it first.
+        """
+        key = ResLoc.from_like(key)
+        obj = self._shared.get(key)
+        if obj is not None:
+            return obj
+        obj = self.get(key)
+        if obj is None:
+            return default
+        freeze = getattr(obj, "_freeze", None)
+        if freeze is not None:
+            freeze()
+        # setdefault is atomic, so concurrent callers still end up with the same instance
+        return self._shared.setdefault(key, obj)
+
     @override
     def get[D](self, key: ResLocLike, default: D = None) -> T | D:
         tp = super().get(key)
@@ -133,6 +170,11 @@ class DefaultedInstantiatingRegistry[T: Registered](InstantiatingRegistry[T]):
         obj = self._base_type(key)
         return obj
 
+    @override
+    def _id_table_entry(self, key: ResLoc) -> Any:
+        tp = super()._id_table_entry(key)
+        return tp if tp is not None else partial(self._base_type, key)
+
 
 # PERFECTION!
 class DefaultedInstantiatingRegisteredAndLazyDefaultInstanceProto(
@@ -158,6 +200,7 @@ def flexible_param_get_instance[T: DefaultedInstantiatingRegisteredAndLazyDefaul
         value: type[T]
         return value.get_default_instance()
     elif isinstance(value, (ResLoc, str)):
-        return registry[value]
+        # like the default instances, this is shared, so callers mustn't modify it
+        return registry.get_shared(value)
     else:
         raise TypeError(value)
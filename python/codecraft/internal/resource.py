@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-import string
+import re
+import threading
 from typing import final, TYPE_CHECKING
+from weakref import WeakValueDictionary
 
 from codecraft.internal.constants import MODID
 
@@ -10,37 +12,62 @@ if TYPE_CHECKING:
 
 __all__ = ("ResLoc", "ResLocLike")
 
-_VALID_NAMESPACE_CHARS = {ord(c) for c in "_-/." + string.ascii_lowercase + string.digits}
-_VALID_PATH_CHARS = {ord(c) for c in "_-." + string.ascii_lowercase + string.digits}
+# same as Minecraft's ResourceLocation
+_NAMESPACE_PATTERN = re.compile(r"[a-z0-9_.-]*")
+_PATH_PATTERN = re.compile(r"[a-z0-9_.\-/]*")
 
 type ResLocLike = ResLoc | str
 
+# (namespace, path) -> the instance, which is dropped once unused, so that dynamic names don't accumulate
+_INTERNED: WeakValueDictionary[tuple[str, str], ResLoc] = WeakValueDictionary()
+_INTERN_LOCK = threading.Lock()
+
 
 @final
 class ResLoc:
-    __slots__ = "namespace", "path"
+    """An immutable resource location.
+
+    Instances are interned, so equal resource locations are the same object.
+    """
+
+    __slots__ = "namespace", "path", "_str", "_hash", "__weakref__"
+
+    namespace: str
+    path: str
 
-    def __init__(self, a: str, b: Optional[str] = None):
+    def __new__(cls, a: str, b: Optional[str] = None):
         if b is not None:
-            self.namespace = a
-            self.path = b
+            key = a, b
         else:
-            split = a.split(":")
-            if len(split) == 1:
-                self.namespace = "minecraft"
-                self.path = split[0]
-            elif len(split) == 2:
-                self.namespace, self.path = split
-            else:
-                raise ValueError(f"Invalid resource location: \"{a}\"")
-
-        # TODO: maybe regex is be faster?
-        valid_namespace_chars = _VALID_NAMESPACE_CHARS
-        valid_path_chars = _VALID_PATH_CHARS
-        if any(ord(c) not in valid_namespace_chars for c in self.namespace):
-            raise ValueError(f"Invalid namespace: \"{self.namespace}\"")
-        if any(ord(c) not in valid_path_chars for c in self.path):
-            raise ValueError(f"Invalid path: \"{self.path}\"")
+            namespace, sep, path = a.partition(":")
+            key = (namespace, path) if sep else ("minecraft", a)
+        obj = _INTERNED.get(key)
+        if obj is not None:
+            return obj
+
+        namespace, path = key
+        if ":" in path and b is None:
+            raise ValueError(f"Invalid resource location: \"{a}\"")
+        if not _NAMESPACE_PATTERN.fullmatch(namespace):
+            raise ValueError(f"Invalid namespace: \"{namespace}\"")
+        if not _PATH_PATTERN.fullmatch(path):
+            raise ValueError(f"Invalid path: \"{path}\"")
+
+        canonical = f"{namespace}:{path}"
+        obj = object.__new__(cls)
+        object.__setattr__(obj, "namespace", namespace)
+        object.__setattr__(obj, "path", path)
+        object.__setattr__(obj, "_str", canonical)
+        object.__setattr__(obj, "_hash", hash(canonical))
+        # concurrent creations still end up with the same instance
+        with _INTERN_LOCK:
+            return _INTERNED.setdefault(key, obj)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __reduce__(self):
+        return ResLoc, (self._str,)
 
     @classmethod
     def from_like(cls, value: ResLocLike) -> Self:
@@ -58,18 +85,20 @@ class ResLoc:
         return cls.from_like(value)
 
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, ResLoc):
             return False
-        return other.namespace == self.namespace and other.path == self.path
+        return other._str == self._str
 
     def __str__(self):
-        return f"{self.namespace}:{self.path}"
+        return self._str
 
     def __repr__(self):
-        return f"<{self.namespace}:{self.path}>"
+        return f"<{self._str}>"
 
     def __hash__(self):
-        return hash(self.namespace) ^ hash(self.path)
+        return self._hash
 
     @classmethod
     def codecraft(cls, path: str) -> Self:
@@ -39,7 +39,7 @@ class World(Registered["World", DefaultedInstantiatingRegistry["World"]], LazyDe
         drop_item: bool = False,
         on_tick: bool = True,
         set_state: bool = True,
-        set_nbt: bool = True  # TODO
+        set_nbt: bool = True
     ) -> None:
         pos = Vec3i(pos)
         block = flexible_param_get_instance(block, Block.registry)
@@ -63,7 +63,7 @@ class World(Registered["World", DefaultedInstantiatingRegistry["World"]], LazyDe
         if set_state:
             flags |= SetBlockFlags.SET_STATE
 
-        if set_nbt and block.nbt:
+        if set_nbt and block.nbt is not None:
             flags |= SetBlockFlags.SET_NBT
 
         return _cc().run_cmd(SetBlockCmd(self, pos, block, flags))
@@ -0,0 +1,27 @@
+import time
+import asyncio
+
+import codecraft
+
+
+async def bench(same_loop: bool):
+    client = codecraft.CCClient("ws://127.0.0.1:6767", establish=False, same_loop=same_loop)
+    await client.establish()
+    with client:
+        t = time.perf_counter()
+        for i in range(1000):
+            await codecraft.send_chat(str(i))
+        print(f"{same_loop=} sequential: took {time.perf_counter() - t:.3f}s")
+
+        t = time.perf_counter()
+        await asyncio.gather(*[codecraft.send_chat(str(i)) for i in range(1000)])
+        print(f"{same_loop=} gather: took {time.perf_counter() - t:.3f}s")
+    await client.close()
+
+
+async def main():
+    await bench(same_loop=False)
+    await bench(same_loop=True)
+
+
+asyncio.run(main())
@@ -0,0 +1,10 @@
+import time
+import codecraft
+
+client = codecraft.CCClient("ws://127.0.0.1:6767")
+
+t = time.perf_counter()
+with client.pipeline():
+    for i in range(1000):
+        codecraft.send_chat(str(i))
+print(f"Took {time.perf_counter() - t:.3f}s")
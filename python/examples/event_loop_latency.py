@@ -0,0 +1,37 @@
+"""Compare the per-command latency of the available event loop implementations.
+
+The networking thread and synchronous calls use the implementation configured by `CCConfig.event_loop`,
+this runs same-loop clients on each implementation to compare them in one process.
+"""
+
+import time
+import asyncio
+import importlib
+
+import codecraft
+
+N = 1000
+
+
+async def bench(name: str):
+    client = codecraft.CCClient("ws://127.0.0.1:6767", establish=False, same_loop=True)
+    await client.establish()
+    with client:
+        for i in range(100):  # warm up
+            await codecraft.send_chat(str(i))
+
+        t = time.perf_counter()
+        for i in range(N):
+            await codecraft.send_chat(str(i))
+        print(f"{name}: {(time.perf_counter() - t) / N * 1e6:.1f}µs per command")
+    await client.close()
+
+
+for name in ("asyncio", "uvloop", "winloop"):
+    try:
+        factory = importlib.import_module(name).new_event_loop
+    except ImportError:
+        print(f"{name}: not installed")
+        continue
+    with asyncio.Runner(loop_factory=factory) as runner:
+        runner.run(bench(name))
@@ -0,0 +1,29 @@
+"""Compare the per-command overhead of synchronous calls with and without `CCConfig.loop_free_sync`.
+
+Without it, every synchronous call runs the command through `auto_async`, on an event loop in the calling thread.
+"""
+
+import time
+
+import codecraft
+from codecraft.config import CCConfig
+
+N = 1000
+
+
+def bench(name: str):
+    client = codecraft.CCClient("ws://127.0.0.1:6767")
+    with client:
+        for i in range(100):  # warm up
+            codecraft.send_chat(str(i))
+
+        t = time.perf_counter()
+        for i in range(N):
+            codecraft.send_chat(str(i))
+        print(f"{name}: {(time.perf_counter() - t) / N * 1e6:.1f}µs per command")
+    client.close()
+
+
+for loop_free in (False, True):
+    CCConfig.loop_free_sync = loop_free  # read when a client is created
+    bench("loop-free" if loop_free else "auto_async")
@@ -0,0 +1,113 @@
+"""The vectorized and bulk codecs of `ByteBuf` must produce exactly the same bytes as the scalar ones."""
+
+from array import array
+import random
+
+import numpy as np
+import pytest
+
+from codecraft.internal.byte_buf.byte_buf import ByteBuf, VECTORIZE_THRESHOLD
+
+# (name, min, max)
+VAR_TYPES = [
+    ("varint", -2 ** 31, 2 ** 31 - 1),
+    ("uvarint", 0, 2 ** 32 - 1),
+    ("varlong", -2 ** 63, 2 ** 63 - 1),
+    ("uvarlong", 0, 2 ** 64 - 1),
+]
+
+# (name, array type code, min, max)
+FIXED_TYPES = [
+    ("byte", "b", -2 ** 7, 2 ** 7 - 1),
+    ("short", "h", -2 ** 15, 2 ** 15 - 1),
+    ("int", "i", -2 ** 31, 2 ** 31 - 1),
+    ("long", "q", -2 ** 63, 2 ** 63 - 1),
+    ("ubyte", "B", 0, 2 ** 8 - 1),
+    ("ushort", "H", 0, 2 ** 16 - 1),
+    ("uint", "I", 0, 2 ** 32 - 1),
+    ("ulong", "Q", 0, 2 ** 64 - 1),
+]
+
+LENGTHS = [0, 1, VECTORIZE_THRESHOLD - 1, VECTORIZE_THRESHOLD, 1000]
+
+
+def _values(lo: int, hi: int, n: int, seed: int) -> list[int]:
+    """`n` values including the bounds and the length boundaries of the var len encoding."""
+    rng = random.Random(seed)
+    special = [lo, hi, 0, 1, -1, 127, 128, 16383, 16384, lo + 1, hi - 1]
+    special += [s * (1 << (7 * i)) for i in range(1, 10) for s in (1, -1)]
+    special = [v for v in special if lo <= v <= hi]
+    values = [rng.choice(special) if rng.random() < 0.3 else rng.randint(lo, hi) for _ in range(n)]
+    # bits of every width, so that every encoded length is covered
+    return [v >> rng.randrange(64) if rng.random() < 0.5 else v for v in values]
+
+
+def _scalar_bytes(name: str, values: list[int]) -> bytes:
+    buf = ByteBuf().write_uvarint(len(values))
+    write = getattr(buf, f"write_{name}")
+    for value in values:
+        write(value)
+    return bytes(buf)
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+@pytest.mark.parametrize("name, lo, hi", VAR_TYPES)
+def test_var_sequence_matches_scalar(name, lo, hi, n):
+    values = _values(lo, hi, n, n)
+    expected = _scalar_bytes(name, values)
+
+    assert bytes(getattr(ByteBuf(), f"write_{name}_sequence")(values)) == expected
+    dtype = np.int64 if lo < 0 else np.uint64
+    assert bytes(getattr(ByteBuf(), f"write_{name}_ndarray")(np.array(values, dtype=dtype))) == expected
+
+    assert getattr(ByteBuf(expected), f"read_{name}_tuple")() == tuple(values)
+    buf = ByteBuf(memoryview(expected))
+    assert getattr(buf, f"read_{name}_ndarray")().tolist() == values
+    assert buf.remaining == 0
+
+
+@pytest.mark.parametrize("name, lo, hi", VAR_TYPES)
+def test_var_out_of_range(name, lo, hi):
+    for value in (lo - 1, hi + 1):
+        with pytest.raises(ValueError):
+            getattr(ByteBuf(), f"write_{name}")(value)
+        with pytest.raises(ValueError):
+            getattr(ByteBuf(), f"write_{name}_sequence")([0] * VECTORIZE_THRESHOLD + [value])
+
+
+@pytest.mark.parametrize("n", [1, VECTORIZE_THRESHOLD])
+def test_var_overflow_rejected(n):
+    # 5 bytes with more than 32 bits of payload
+    data = bytes(ByteBuf().write_uvarint(n)) + b"\xff\xff\xff\xff\x1f" * n
+    with pytest.raises(ValueError, match="too large"):
+        ByteBuf(data).read_uvarint_tuple()
+    with pytest.raises(ValueError, match="too large"):
+        ByteBuf(data).read_uvarint_ndarray()
+
+
+@pytest.mark.parametrize("n", LENGTHS)
+@pytest.mark.parametrize("name, tc, lo, hi", FIXED_TYPES)
+def test_fixed_sequence_matches_array(name, tc, lo, hi, n):
+    values = [random.Random(n).randint(lo, hi) for _ in range(n)]
+    expected = bytes(getattr(ByteBuf(), f"write_{name}_array")(array(tc, values)))
+
+    assert bytes(getattr(ByteBuf(), f"write_{name}_sequence")(values)) == expected
+    assert bytes(getattr(ByteBuf(), f"write_{name}_ndarray")(np.array(values, dtype=f"={tc}"))) == expected
+
+    assert getattr(ByteBuf(expected), f"read_{name}_tuple")() == tuple(values)
+    assert getattr(ByteBuf(expected), f"read_{name}_array")().tolist() == values
+    assert getattr(ByteBuf(memoryview(expected)), f"read_{name}_ndarray")().tolist() == values
+
+
+@pytest.mark.parametrize("n", [0, 1, 300])
+def test_varint_ascii_pairs_match_scalar(n):
+    rng = random.Random(n)
+    pairs = [(rng.randint(-2 ** 31, 2 ** 31 - 1), "x" * rng.randrange(200)) for _ in range(n)]
+    buf = ByteBuf().write_uvarint(n)
+    for value, text in pairs:
+        buf.write_varint(value).write_ascii(text)
+    buf.write_byte(42)
+
+    buf = ByteBuf(bytes(buf))
+    assert buf.read_varint_ascii_pairs() == pairs
+    assert buf.read_byte() == 42
@@ -0,0 +1,34 @@
+import pytest
+
+from codecraft.internal.id_map import BlockStateIdMap
+
+
+def _state_map() -> BlockStateIdMap:
+    id_map = BlockStateIdMap(None)
+    # put out of order, like a sync packet may be
+    id_map.put(2, 10, 13, {"facing": (1, ["north", "south", "east", "west"]), "lit": (4, ["true", "false"])})
+    id_map.put(0, 0, 0, {})
+    id_map.put(1, 1, 1, {"level": (1, [str(i) for i in range(9)])})
+    return id_map
+
+
+def test_get_state():
+    id_map = _state_map()
+    assert id_map.get_state(0) == (0, {})
+    assert id_map.get_state(1) == (1, {"level": "0"})
+    assert id_map.get_state(9) == (1, {"level": "8"})
+    assert id_map.get_state(10) == (2, {"facing": "north", "lit": "true"})
+    assert id_map.get_state(17) == (2, {"facing": "west", "lit": "false"})
+
+
+@pytest.mark.parametrize("id", [-1, 18, 1000])
+def test_get_state_out_of_range(id):
+    with pytest.raises(KeyError):
+        _state_map().get_state(id)
+
+
+def test_put_after_lookup():
+    id_map = _state_map()
+    id_map.get_state(0)
+    id_map.put(3, 18, 18, {})
+    assert id_map.get_state(18) == (3, {})